@@ -2,31 +2,103 @@ import random
 import os
 import time
 import threading
+import signal
 from telebot import types, TeleBot, custom_filters
 from telebot.storage import StateMemoryStorage
-from telebot.handler_backends import State, StatesGroup
+from telebot.handler_backends import State, StatesGroup, BaseMiddleware
 from dotenv import load_dotenv
-from database import DatabaseManager
+from database import DatabaseManager, USER_WORDS_CATEGORY
+from send_queue import SendQueue
+from broadcast import Broadcaster
+from metrics import Metrics, MetricsMiddleware, MetricsServer
+from event_log import QuizEventLog
+from retention import RetentionJob
+from vocab_index import VocabularyIndex, normalize
+from dispatcher import UpdateDispatcher, PRIORITY_HIGH, PRIORITY_LOW
+from session_snapshot import SessionSnapshot
+from tracing import Tracer
+from slow_query_log import SlowQueryLog
+from profiler import SamplingProfiler
 
 load_dotenv()
 
 user_data = {}
 user_activity = {}
 user_question_count = {}
+user_categories = {}
+quiz_rounds = {}
+busy_notified = {}
 
 print('Starting Telegram bot...')
 
 state_storage = StateMemoryStorage()
 token_bot = os.getenv('BOT_TOKEN', '')
-bot = TeleBot(token_bot, state_storage=state_storage)
+bot = TeleBot(token_bot, state_storage=state_storage, use_class_middlewares=True, threaded=False)
+tracer = Tracer()
+dispatcher = UpdateDispatcher(bot, tracer=tracer)
+dispatcher.install()
+outbox = SendQueue(bot, tracer=tracer)
 
-db = DatabaseManager()
+db = DatabaseManager(session_workers=dispatcher.workers)
+broadcaster = Broadcaster(db, outbox)
+event_log = QuizEventLog(db)
+retention = RetentionJob(db)
+vocabulary = VocabularyIndex(db)
+
+class DatabaseSessionMiddleware(BaseMiddleware):
+    def __init__(self, db, tracer, activity):
+        super().__init__()
+        self.db = db
+        self.tracer = tracer
+        self.activity = activity
+        self.update_types = ['message', 'callback_query', 'inline_query']
+    
+    def pre_process(self, message, data):
+        if message.from_user:
+            self.activity.touch(message.from_user.id)
+        self.db.begin_session()
+    
+    def post_process(self, message, data, exception):
+        try:
+            with self.tracer.span('db.commit' if exception is None else 'db.rollback'):
+                self.db.end_session(commit=exception is None)
+        except Exception as e:
+            print(f"Error finishing database session: {e}")
+
+metrics = Metrics()
+metrics_server = MetricsServer(metrics)
+bot.setup_middleware(DatabaseSessionMiddleware(db, tracer, event_log))
+bot.setup_middleware(MetricsMiddleware(metrics))
+db.add_query_listener(lambda query, params, elapsed: metrics.observe('db', elapsed))
+db.add_query_listener(tracer.record_query)
+slow_queries = SlowQueryLog(db)
+db.add_query_listener(slow_queries.record)
+metrics_server.add_route('/slow-queries', slow_queries.entries)
+profiler = SamplingProfiler()
+metrics_server.add_route('/profile', profiler.status)
+metrics_server.add_route('/profile/start', profiler.start)
+metrics_server.add_route('/profile/stop', profiler.stop)
+metrics.add_gauge('active_sessions', lambda: len(user_data))
+metrics.add_gauge('send_queue', outbox.stats)
+metrics.add_gauge('event_buffer', event_log.pending)
+metrics.add_gauge('vocabulary_index', vocabulary.stats)
+metrics.add_gauge('dispatch', dispatcher.stats)
+metrics.add_gauge('traces', tracer.stats)
+
+snapshot = SessionSnapshot()
+snapshot.track('user_data', user_data)
+snapshot.track('user_question_count', user_question_count)
+snapshot.track('user_activity', user_activity)
+snapshot.track('quiz_rounds', quiz_rounds)
+snapshot.track('states', state_storage.data, int_keys=False)
 
 class Command:
     ADD_WORD = 'добавить слово ➕'
     DELETE_WORD = 'удалить слово 🔙'
     NEXT = 'Следующее слово'
     STATS = 'Статистика'
+    CATEGORIES = 'Темы 📚'
+    ROUND = 'Раунд 🎯'
 
 class MyStates(StatesGroup):
     waiting_for_english = State()
@@ -54,10 +126,45 @@ def cleanup_inactive_users():
             del user_data[user_id]
         if user_id in user_activity:
             del user_activity[user_id]
+        user_categories.pop(user_id, None)
+        finish_round(user_id, announce=False)
         print(f"Cleaned up inactive user: {user_id}")
     
     if users_to_remove:
         print(f"Cleaned up {len(users_to_remove)} inactive users")
+    
+    for chat_id, notified_at in list(busy_notified.items()):
+        if current_time - notified_at > BUSY_REPLY_INTERVAL:
+            busy_notified.pop(chat_id, None)
+
+LOW_PRIORITY_COMMANDS = (Command.STATS, Command.DELETE_WORD, Command.CATEGORIES)
+BUSY_REPLY_INTERVAL = int(os.getenv('BUSY_REPLY_INTERVAL', '30'))
+MAX_SEND_BACKLOG = int(os.getenv('DISPATCH_MAX_SEND_BACKLOG', '500'))
+ROUND_SIZE = int(os.getenv('QUIZ_ROUND_SIZE', '10'))
+ROUND_MAX_SIZE = int(os.getenv('QUIZ_ROUND_MAX_SIZE', '50'))
+
+def update_priority(update):
+    if update.message is not None:
+        return PRIORITY_LOW if update.message.text in LOW_PRIORITY_COMMANDS else PRIORITY_HIGH
+    if update.callback_query is not None:
+        return PRIORITY_LOW if (update.callback_query.data or '').startswith('delete_') else PRIORITY_HIGH
+    return PRIORITY_LOW
+
+def reply_busy(update, reason):
+    if update.message is not None:
+        cid = update.message.chat.id
+    elif update.callback_query is not None and update.callback_query.message is not None:
+        cid = update.callback_query.message.chat.id
+    else:
+        return
+    
+    now = time.time()
+    if now - busy_notified.get(cid, 0) < BUSY_REPLY_INTERVAL:
+        return
+    busy_notified[cid] = now
+    outbox.send_message(cid, "Сейчас бот перегружен 🙏 Попробуй ещё раз через минуту.")
+
+dispatcher.set_admission(update_priority, reply_busy, lambda: outbox.depth() > MAX_SEND_BACKLOG)
 
 @bot.message_handler(commands=['start'])
 def send_welcome(message):
@@ -80,42 +187,94 @@ def send_welcome(message):
     add_word_btn = types.KeyboardButton(Command.ADD_WORD)
     delete_word_btn = types.KeyboardButton(Command.DELETE_WORD)
     stats_btn = types.KeyboardButton(Command.STATS)
+    categories_btn = types.KeyboardButton(Command.CATEGORIES)
+    round_btn = types.KeyboardButton(Command.ROUND)
     
-    markup.add(next_btn, add_word_btn, delete_word_btn, stats_btn)
+    markup.add(next_btn, add_word_btn, delete_word_btn, stats_btn, categories_btn, round_btn)
     
-    bot.send_message(cid, greeting, reply_markup=markup)
+    outbox.send_message(cid, greeting, reply_markup=markup)
+
+def get_user_categories(user_id):
+    if user_id not in user_categories:
+        categories = db.get_user_categories(user_id)
+        if categories is None:
+            return []
+        user_categories[user_id] = categories
+    return user_categories[user_id]
+
+def categories_markup(user_id):
+    selected = get_user_categories(user_id)
+    markup = types.InlineKeyboardMarkup(row_width=2)
+    
+    buttons = []
+    for category, words_count in db.get_categories():
+        mark = '✅ ' if category in selected else ''
+        buttons.append(types.InlineKeyboardButton(f"{mark}{category} ({words_count})", callback_data=f"category:{category}"))
+    mark = '✅ ' if USER_WORDS_CATEGORY in selected else ''
+    buttons.append(types.InlineKeyboardButton(f"{mark}Мои слова", callback_data=f"category:{USER_WORDS_CATEGORY}"))
+    markup.add(*buttons)
+    
+    markup.add(
+        types.InlineKeyboardButton("Все слова", callback_data="categories_all"),
+        types.InlineKeyboardButton("Готово", callback_data="categories_done")
+    )
+    return markup
 
 def create_cards(message):
     cid = message.chat.id
     
+    quiz_round = quiz_rounds.get(cid)
+    if quiz_round is not None:
+        if quiz_round['position'] < len(quiz_round['cards']):
+            card = quiz_round['cards'][quiz_round['position']]
+            quiz_round['position'] += 1
+            show_card(message, card, card['other_words'])
+        else:
+            finish_round(cid)
+        return
+    
+    categories = get_user_categories(cid)
+    
     try:
-        word_data = db.get_random_word(cid)
+        word_data = db.get_random_word(cid, categories)
+        if not word_data and categories:
+            print(f"No words in categories {categories} for user {cid}, using all words")
+            categories = []
+            word_data = db.get_random_word(cid)
         if not word_data:
             print(f"Warning: No word data returned for user {cid}")
-            bot.send_message(cid, "К сожалению, не удалось получить слово для изучения. Попробуйте отправить /start")
+            outbox.send_message(cid, "К сожалению, не удалось получить слово для изучения. Попробуйте отправить /start")
             return
         
         if not word_data.get('english_word') or not word_data.get('translation_word'):
             print(f"Warning: Invalid word data for user {cid}: {word_data}")
-            bot.send_message(cid, "Получены некорректные данные слова. Попробуйте отправить /start")
+            outbox.send_message(cid, "Получены некорректные данные слова. Попробуйте отправить /start")
             return
             
     except Exception as e:
         print(f"Error getting random word: {e}")
-        bot.send_message(cid, "Произошла ошибка при получении слова. Попробуйте отправить /start")
+        outbox.send_message(cid, "Произошла ошибка при получении слова. Попробуйте отправить /start")
         return
     
-    other_words_data = db.get_random_words_for_quiz(cid, word_data['english_word'], 3)
+    other_words_data = db.get_random_words_for_quiz(cid, word_data['english_word'], 3, categories)
+    if categories and len(other_words_data) < 3:
+        for word in db.get_random_words_for_quiz(cid, word_data['english_word'], 6):
+            if len(other_words_data) < 3 and word not in other_words_data:
+                other_words_data.append(word)
     
     if len(other_words_data) < 3:
         print(f"Warning: Only {len(other_words_data)} other words available for user {cid}")
     
+    show_card(message, word_data, other_words_data)
+
+def show_card(message, word_data, other_words_data):
+    cid = message.chat.id
     markup = types.ReplyKeyboardMarkup(row_width=2, resize_keyboard=True)
     
     all_options = [word_data['english_word']] + other_words_data
     if len(all_options) < 4:
         print(f"Warning: Not enough options for quiz. User {cid} has only {len(all_options)} options")
-        bot.send_message(cid, "Недостаточно слов для создания викторины. Попробуйте добавить больше слов.")
+        outbox.send_message(cid, "Недостаточно слов для создания викторины. Попробуйте добавить больше слов.")
         return
     
     random.shuffle(all_options)
@@ -127,10 +286,12 @@ def create_cards(message):
     add_word_btn = types.KeyboardButton(Command.ADD_WORD)
     delete_word_btn = types.KeyboardButton(Command.DELETE_WORD)
     stats_btn = types.KeyboardButton(Command.STATS)
-    markup.add(next_btn, add_word_btn, delete_word_btn, stats_btn)
+    categories_btn = types.KeyboardButton(Command.CATEGORIES)
+    round_btn = types.KeyboardButton(Command.ROUND)
+    markup.add(next_btn, add_word_btn, delete_word_btn, stats_btn, categories_btn, round_btn)
     
     greeting = f"Выбери перевод слова: 🇷🇺 {word_data['translation_word']}"
-    bot.send_message(cid, greeting, reply_markup=markup)
+    outbox.send_message(cid, greeting, reply_markup=markup)
     
     user_id = message.from_user.id
     
@@ -143,7 +304,8 @@ def create_cards(message):
         'translate_word': word_data['translation_word'],
         'word_type': word_data['word_type'],
         'word_id': word_data['word_id'],
-        'other_words': other_words_data
+        'other_words': other_words_data,
+        'asked_at': time.time()
     }
     
     print(f"Saved word data for user {user_id}: {user_data[user_id]}")
@@ -154,11 +316,93 @@ def create_cards(message):
 def next_cards(message):
     create_cards(message)
 
+@bot.message_handler(commands=['round'])
+@bot.message_handler(func=lambda message: message.text == Command.ROUND)
+def start_round(message):
+    cid = message.chat.id
+    user_activity[message.from_user.id] = time.time()
+    
+    size = ROUND_SIZE
+    parts = message.text.split()
+    if len(parts) > 1 and parts[1].isdigit():
+        size = max(1, min(int(parts[1]), ROUND_MAX_SIZE))
+    
+    finish_round(cid, announce=False)
+    
+    categories = get_user_categories(cid)
+    cards = db.get_quiz_round(cid, size, 3, categories)
+    if not cards and categories:
+        print(f"No words in categories {categories} for user {cid}, using all words")
+        cards = db.get_quiz_round(cid, size, 3)
+    cards = [card for card in cards if len(card['other_words']) >= 3]
+    
+    if not cards:
+        outbox.send_message(cid, "Недостаточно слов для раунда. Попробуйте добавить больше слов.")
+        return
+    
+    quiz_rounds[cid] = {
+        'cards': cards,
+        'position': 0,
+        'results': [None] * len(cards),
+        'events': [],
+        'started_at': time.time()
+    }
+    outbox.send_message(cid, f"Раунд из {len(cards)} карточек. Поехали! 🎯")
+    create_cards(message)
+
+def record_answer(cid, word_id, word_type, text, is_correct, latency_ms):
+    quiz_round = quiz_rounds.get(cid)
+    if quiz_round is None:
+        event_log.record(cid, word_id, word_type, text, is_correct, latency_ms)
+        return
+    
+    quiz_round['events'].append([cid, word_id, word_type, text, is_correct, latency_ms, time.time()])
+    index = quiz_round['position'] - 1
+    if quiz_round['results'][index] is None:
+        quiz_round['results'][index] = is_correct
+
+def finish_round(cid, announce=True):
+    quiz_round = quiz_rounds.pop(cid, None)
+    if quiz_round is None:
+        return
+    if quiz_round['events']:
+        event_log.record_many(quiz_round['events'])
+    if not announce:
+        return
+    
+    cards = quiz_round['cards']
+    results = quiz_round['results']
+    minutes, seconds = divmod(int(time.time() - quiz_round['started_at']), 60)
+    summary = [
+        "Раунд завершён! 🏁",
+        f"С первой попытки: {results.count(True)} из {len(cards)}",
+        f"Время: {minutes} мин {seconds} с"
+    ]
+    mistakes = [show_target({'target_word': card['english_word'], 'translate_word': card['translation_word']})
+                for card, result in zip(cards, results) if result is False]
+    if mistakes:
+        summary.append("\nПовтори эти слова:")
+        summary.extend(mistakes)
+    skipped = results.count(None)
+    if skipped:
+        summary.append(f"\nПропущено: {skipped}")
+    
+    markup = types.ReplyKeyboardMarkup(row_width=2, resize_keyboard=True)
+    next_btn = types.KeyboardButton(Command.NEXT)
+    add_word_btn = types.KeyboardButton(Command.ADD_WORD)
+    delete_word_btn = types.KeyboardButton(Command.DELETE_WORD)
+    stats_btn = types.KeyboardButton(Command.STATS)
+    categories_btn = types.KeyboardButton(Command.CATEGORIES)
+    round_btn = types.KeyboardButton(Command.ROUND)
+    markup.add(next_btn, add_word_btn, delete_word_btn, stats_btn, categories_btn, round_btn)
+    
+    outbox.send_message(cid, show_hint(*summary), reply_markup=markup)
+
 @bot.message_handler(func=lambda message: message.text == Command.ADD_WORD)
 def add_word_start(message):
     cid = message.chat.id
     bot.set_state(message.from_user.id, MyStates.waiting_for_english, cid)
-    bot.send_message(cid, "Введите английское слово:")
+    outbox.send_message(cid, "Введите английское слово:")
 
 @bot.message_handler(state=MyStates.waiting_for_english)
 def add_word_english(message):
@@ -166,7 +410,7 @@ def add_word_english(message):
     english_word = message.text.strip()
     
     if not english_word or len(english_word) < 2:
-        bot.send_message(cid, "Пожалуйста, введите корректное английское слово (минимум 2 символа).")
+        outbox.send_message(cid, "Пожалуйста, введите корректное английское слово (минимум 2 символа).")
         return
     
     user_id = message.from_user.id
@@ -175,7 +419,7 @@ def add_word_english(message):
     user_data[user_id]['new_english_word'] = english_word
     
     bot.set_state(message.from_user.id, MyStates.waiting_for_russian, cid)
-    bot.send_message(cid, f"Теперь введите перевод для слова '{english_word}':")
+    outbox.send_message(cid, f"Теперь введите перевод для слова '{english_word}':")
 
 @bot.message_handler(state=MyStates.waiting_for_russian)
 def add_word_russian(message):
@@ -183,17 +427,18 @@ def add_word_russian(message):
     russian_word = message.text.strip()
     
     if not russian_word or len(russian_word) < 2:
-        bot.send_message(cid, "Пожалуйста, введите корректный перевод (минимум 2 символа).")
+        outbox.send_message(cid, "Пожалуйста, введите корректный перевод (минимум 2 символа).")
         return
     
     user_id = message.from_user.id
     english_word = user_data.get(user_id, {}).get('new_english_word', '')
     
     if db.add_user_word(cid, english_word, russian_word):
+        vocabulary.add_user_word(cid, english_word, russian_word)
         words_count = db.get_user_words_count(cid)
-        bot.send_message(cid, f"Слово '{english_word}' успешно добавлено!\n\nТеперь у тебя {words_count} персональных слов для изучения.")
+        outbox.send_message(cid, f"Слово '{english_word}' успешно добавлено!\n\nТеперь у тебя {words_count} персональных слов для изучения.")
     else:
-        bot.send_message(cid, "Произошла ошибка при добавлении слова. Попробуйте позже.")
+        outbox.send_message(cid, "Произошла ошибка при добавлении слова. Попробуйте позже.")
     
     bot.delete_state(message.from_user.id, cid)
     
@@ -206,13 +451,13 @@ def delete_word_start(message):
     words_count = db.get_user_words_count(cid)
     
     if words_count == 0:
-        bot.send_message(cid, "У тебя пока нет персональных слов для удаления.")
+        outbox.send_message(cid, "У тебя пока нет персональных слов для удаления.")
         return
     
     user_words = db.get_user_words(cid)
     
     if not user_words:
-        bot.send_message(cid, "Не удалось получить список слов для удаления.")
+        outbox.send_message(cid, "Не удалось получить список слов для удаления.")
         return
     
     markup = types.InlineKeyboardMarkup(row_width=1)
@@ -224,7 +469,7 @@ def delete_word_start(message):
         )
         markup.add(delete_btn)
     
-    bot.send_message(cid, f"Выбери слово для удаления (у тебя {words_count} персональных слов):", reply_markup=markup)
+    outbox.send_message(cid, f"Выбери слово для удаления (у тебя {words_count} персональных слов):", reply_markup=markup)
 
 @bot.callback_query_handler(func=lambda call: call.data.startswith('delete_'))
 def delete_word_confirmation(call):
@@ -232,8 +477,9 @@ def delete_word_confirmation(call):
     english_word = call.data.replace('delete_', '')
     
     if db.delete_user_word(cid, english_word):
+        vocabulary.remove_user_word(cid, english_word)
         remaining_count = db.get_user_words_count(cid)
-        bot.edit_message_text(
+        outbox.edit_message_text(
             f"✅ Слово '{english_word}' успешно удалено!\n\nОсталось персональных слов: {remaining_count}",
             cid, 
             call.message.message_id
@@ -243,11 +489,11 @@ def delete_word_confirmation(call):
             markup = types.InlineKeyboardMarkup()
             continue_btn = types.InlineKeyboardButton("Продолжить изучение", callback_data="continue_learning")
             markup.add(continue_btn)
-            bot.send_message(cid, "Что делаем дальше?", reply_markup=markup)
+            outbox.send_message(cid, "Что делаем дальше?", reply_markup=markup)
         else:
             create_cards(call.message)
     else:
-        bot.edit_message_text(
+        outbox.edit_message_text(
             f"❌ Ошибка при удалении слова '{english_word}'.",
             cid, 
             call.message.message_id
@@ -256,9 +502,73 @@ def delete_word_confirmation(call):
 @bot.callback_query_handler(func=lambda call: call.data == "continue_learning")
 def continue_learning_handler(call):
     cid = call.message.chat.id
-    bot.edit_message_text("Продолжаем изучение!", cid, call.message.message_id)
+    outbox.edit_message_text("Продолжаем изучение!", cid, call.message.message_id)
     create_cards(call.message)
 
+@bot.message_handler(func=lambda message: message.text == Command.CATEGORIES)
+def choose_categories(message):
+    cid = message.chat.id
+    outbox.send_message(
+        cid,
+        "Выбери темы для тренировки. Если ничего не выбрано, в карточках будут все слова.",
+        reply_markup=categories_markup(cid)
+    )
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith('category:') or call.data == "categories_all")
+def toggle_category(call):
+    cid = call.message.chat.id
+    
+    if call.data == "categories_all":
+        if not get_user_categories(cid):
+            return
+        selected = []
+    else:
+        category = call.data.replace('category:', '', 1)
+        selected = list(get_user_categories(cid))
+        if category in selected:
+            selected.remove(category)
+        else:
+            selected.append(category)
+    
+    if not db.set_user_categories(cid, selected):
+        outbox.send_message(cid, "Не удалось сохранить выбор тем. Попробуйте позже.")
+        return
+    user_categories[cid] = selected
+    
+    outbox.edit_message_text(
+        "Выбери темы для тренировки. Если ничего не выбрано, в карточках будут все слова.",
+        cid,
+        call.message.message_id,
+        reply_markup=categories_markup(cid)
+    )
+
+@bot.callback_query_handler(func=lambda call: call.data == "categories_done")
+def categories_done(call):
+    cid = call.message.chat.id
+    selected = get_user_categories(cid)
+    if selected:
+        names = ', '.join('Мои слова' if category == USER_WORDS_CATEGORY else category for category in selected)
+        outbox.edit_message_text(f"Темы для тренировки: {names}", cid, call.message.message_id)
+    else:
+        outbox.edit_message_text("Тренируемся на всех словах.", cid, call.message.message_id)
+    create_cards(call.message)
+
+@bot.inline_handler(func=lambda query: True)
+def search_vocabulary(query):
+    results = []
+    for number, (english_word, translation_word, category) in enumerate(vocabulary.search(query.from_user.id, query.query)):
+        results.append(types.InlineQueryResultArticle(
+            id=str(number),
+            title=f"{english_word} — {translation_word}",
+            description=category or "Мои слова",
+            input_message_content=types.InputTextMessageContent(f"{english_word} — {translation_word}")
+        ))
+    
+    try:
+        bot.answer_inline_query(query.id, results, cache_time=5, is_personal=True)
+    except Exception as e:
+        print(f"Error answering inline query: {e}")
+
 @bot.message_handler(func=lambda message: message.text == Command.STATS)
 def show_stats(message):
     cid = message.chat.id
@@ -283,7 +593,7 @@ def show_stats(message):
 
 Совет: Добавляй новые слова для расширения словарного запаса!"""
     
-    bot.send_message(cid, stats_text)
+    outbox.send_message(cid, stats_text)
 
 @bot.message_handler(func=lambda message: True, content_types=['text'])
 def message_reply(message):
@@ -293,7 +603,7 @@ def message_reply(message):
     
     user_activity[user_id] = time.time()
     
-    if text in [Command.NEXT, Command.ADD_WORD, Command.DELETE_WORD, Command.STATS]:
+    if text in [Command.NEXT, Command.ADD_WORD, Command.DELETE_WORD, Command.STATS, Command.CATEGORIES, Command.ROUND]:
         return
     
     data = user_data.get(user_id, {})
@@ -303,15 +613,15 @@ def message_reply(message):
     if 'target_word' not in data:
         print(f"No target_word found for user {user_id}, creating new cards")
         try:
-            bot.send_message(cid, "Создаю новое слово для изучения...")
+            outbox.send_message(cid, "Создаю новое слово для изучения...")
             create_cards(message)
         except Exception as e:
             print(f"Error creating cards: {e}")
-            bot.send_message(cid, "Произошла ошибка. Попробуйте отправить /start")
+            outbox.send_message(cid, "Произошла ошибка. Попробуйте отправить /start")
         return
     
     if not text or len(text.strip()) < 1:
-        bot.send_message(cid, "❌ Пожалуйста, введите корректный ответ!")
+        outbox.send_message(cid, "❌ Пожалуйста, введите корректный ответ!")
         return
     
     target_word = data['target_word']
@@ -321,31 +631,35 @@ def message_reply(message):
     
     print(f"Checking answer: '{text}' against target: '{target_word}'")
     
+    answer = normalize(text)
     valid_options = [target_word] + data.get('other_words', [])
-    if text not in valid_options:
-        bot.send_message(cid, f"❌ Пожалуйста, выберите один из предложенных вариантов ответа!")
+    chosen = next((option for option in valid_options if normalize(option) == answer), None)
+    if chosen is None:
+        outbox.send_message(cid, f"❌ Пожалуйста, выберите один из предложенных вариантов ответа!")
         return
     
-    if text == target_word:
-        bot.send_message(cid, f"Отлично! ❤️ {target_word} -> {translate_word}")
+    asked_at = data.get('asked_at')
+    latency_ms = int((time.time() - asked_at) * 1000) if asked_at else None
+    
+    if answer == normalize(target_word):
+        outbox.send_message(cid, f"Отлично! ❤️ {target_word} -> {translate_word}")
         
         if word_id and word_type:
-            db.update_learning_stats(cid, word_id, word_type, True)
+            record_answer(cid, word_id, word_type, chosen, True, latency_ms)
         
         user_data[user_id] = {}
         
-        time.sleep(1)
         create_cards(message)
     
     else:
-        bot.send_message(cid, f"❌ Неправильно! Твой ответ: '{text}'\n\nПравильный ответ: '{target_word}' -> '{translate_word}'\n\nПопробуй еще раз! 💪")
+        outbox.send_message(cid, f"❌ Неправильно! Твой ответ: '{text}'\n\nПравильный ответ: '{target_word}' -> '{translate_word}'\n\nПопробуй еще раз! 💪")
         
         if word_id and word_type:
-            db.update_learning_stats(cid, word_id, word_type, False)
+            record_answer(cid, word_id, word_type, chosen, False, latency_ms)
         
         print(f"Wrong answer for user {user_id} - keeping word data: {data}")
         
-        bot.send_message(cid, f"Выбери перевод слова: 🇷🇺 {translate_word}")
+        outbox.send_message(cid, f"Выбери перевод слова: 🇷🇺 {translate_word}")
         
         markup = types.ReplyKeyboardMarkup(row_width=2, resize_keyboard=True)
         all_options = [target_word] + data.get('other_words', [])
@@ -357,16 +671,37 @@ def message_reply(message):
         add_word_btn = types.KeyboardButton(Command.ADD_WORD)
         delete_word_btn = types.KeyboardButton(Command.DELETE_WORD)
         stats_btn = types.KeyboardButton(Command.STATS)
-        markup.add(next_btn, add_word_btn, delete_word_btn, stats_btn)
+        categories_btn = types.KeyboardButton(Command.CATEGORIES)
+        round_btn = types.KeyboardButton(Command.ROUND)
+        markup.add(next_btn, add_word_btn, delete_word_btn, stats_btn, categories_btn, round_btn)
         
-        bot.send_message(cid, "Выбери правильный ответ:", reply_markup=markup)
+        outbox.send_message(cid, "Выбери правильный ответ:", reply_markup=markup)
 
 bot.add_custom_filter(custom_filters.StateFilter(bot))
 
+def shutdown():
+    metrics_server.stop()
+    dispatcher.stop()
+    profiler.stop()
+    snapshot.stop()
+    broadcaster.stop()
+    retention.stop()
+    event_log.stop()
+    outbox.stop()
+    tracer.stop()
+    slow_queries.stop()
+    db.close()
+
 if __name__ == '__main__':
     try:
         print("Bot started. Press Ctrl+C to stop.")
         
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        if hasattr(signal, 'SIGBREAK'):
+            signal.signal(signal.SIGBREAK, signal.default_int_handler)
+        if profiler.install_signal():
+            print(f"Send SIGUSR1 to process {os.getpid()} to start or stop profiling")
+        
         def periodic_cleanup():
             while True:
                 try:
@@ -379,10 +714,25 @@ if __name__ == '__main__':
         cleanup_thread = threading.Thread(target=periodic_cleanup, daemon=True)
         cleanup_thread.start()
         
-        bot.infinity_polling(skip_pending=True)
+        restored = snapshot.load()
+        
+        tracer.start()
+        slow_queries.start()
+        outbox.start()
+        dispatcher.start()
+        snapshot.start()
+        broadcaster.start()
+        event_log.start()
+        retention.start()
+        vocabulary.refresh_common()
+        metrics_server.start()
+        
+        bot.infinity_polling(skip_pending=not restored)
+        print("\nBot stopped.")
+        shutdown()
     except KeyboardInterrupt:
         print("\nBot stopped.")
-        db.close()
+        shutdown()
     except Exception as e:
         print(f"Error: {e}")
-        db.close() 
\ No newline at end of file
+        shutdown()
@@ -0,0 +1,105 @@
+import os
+import time
+import threading
+from send_queue import TokenBucket
+
+class Broadcaster:
+    def __init__(self, db, outbox, rate=None, batch_size=None, poll_interval=None):
+        self.db = db
+        self.outbox = outbox
+        self.rate = float(rate or os.getenv('BROADCAST_RATE', '10'))
+        self.batch_size = int(batch_size or os.getenv('BROADCAST_BATCH_SIZE', '100'))
+        self.poll_interval = float(poll_interval or os.getenv('BROADCAST_POLL_INTERVAL', '5'))
+        self._bucket = TokenBucket(self.rate, 1)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="broadcaster", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with self.db.session():
+                    broadcast = self.db.get_active_broadcast()
+                if broadcast and self._process(broadcast):
+                    continue
+            except Exception as e:
+                print(f"Broadcast error: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def _process(self, broadcast):
+        broadcast_id = broadcast['id']
+        last_user_id = broadcast['last_user_id']
+        sent = broadcast['sent_count']
+        failed = broadcast['failed_count']
+
+        if broadcast['status'] == 'pending':
+            print(f"Starting broadcast {broadcast_id} to {broadcast['total_users']} users")
+        else:
+            print(f"Resuming broadcast {broadcast_id} after user {last_user_id} ({sent} sent, {failed} failed)")
+
+        if not self._update(broadcast_id, 'running', last_user_id, sent, failed):
+            return False
+
+        batches = self.db.iter_user_id_batches(last_user_id, self.batch_size)
+        try:
+            for batch in batches:
+                delivered, errors = self._send_batch(broadcast['message_text'], batch)
+                if delivered is None:
+                    return False
+
+                last_user_id = batch[-1]
+                sent += delivered
+                failed += errors
+
+                if not self._update(broadcast_id, 'running', last_user_id, sent, failed):
+                    print(f"Broadcast {broadcast_id} stopped after user {last_user_id}")
+                    return False
+        finally:
+            batches.close()
+
+        self._update(broadcast_id, 'completed', last_user_id, sent, failed)
+        print(f"Broadcast {broadcast_id} completed: {sent} sent, {failed} failed")
+        return True
+
+    def _update(self, broadcast_id, status, last_user_id, sent, failed):
+        with self.db.session():
+            return self.db.update_broadcast(broadcast_id, status, last_user_id, sent, failed)
+
+    def _send_batch(self, text, user_ids):
+        lock = threading.Lock()
+        done = threading.Event()
+        results = {'pending': len(user_ids), 'sent': 0, 'failed': 0}
+
+        def on_delivered(ok):
+            with lock:
+                results['sent' if ok else 'failed'] += 1
+                results['pending'] -= 1
+                if results['pending'] == 0:
+                    done.set()
+
+        for user_id in user_ids:
+            while True:
+                wait = self._bucket.wait_time(time.monotonic())
+                if wait <= 0:
+                    break
+                if self._stop.wait(wait):
+                    return None, None
+            self._bucket.consume(time.monotonic())
+            self.outbox.send_message(user_id, text, callback=on_delivered)
+
+        while not done.wait(1):
+            if self._stop.is_set():
+                return None, None
+
+        return results['sent'], results['failed']
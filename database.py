@@ -1,46 +1,664 @@
 import psycopg2
 import psycopg2.extras
+import psycopg2.extensions
+import psycopg2.pool
 from psycopg2 import Error
+from psycopg2.errors import InvalidSqlStatementName, DuplicatePreparedStatement
 import os
+import io
+import csv
+import re
+import random
+import functools
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
 load_dotenv()
 
+USER_WORDS_CATEGORY = 'user'
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+UNPREPARABLE_ERRORS = (psycopg2.errors.SyntaxError, psycopg2.errors.FeatureNotSupported, psycopg2.errors.IndeterminateDatatype)
+SESSION_SAVEPOINT = 'session_work'
+WORD_KEY_SQL = r"lower(btrim(regexp_replace(normalize(word, NFKC), '\s+', ' ', 'g')))"
+
+def retry_read(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        attempt = 0
+        while True:
+            self.local.disconnected = False
+            result = method(self, *args, **kwargs)
+            if not self.local.disconnected or attempt >= self.read_retries or getattr(self.local, 'wrote', False):
+                return result
+            attempt += 1
+            delay = self._backoff_delay(attempt)
+            print(f"Retrying {method.__name__} after a connection error (attempt {attempt}) in {delay:.2f}s")
+            time.sleep(delay)
+    return wrapper
+
+class StatementConnection(psycopg2.extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+        self.prepare_lock = threading.Lock()
+
+class ReplicaPool:
+    def __init__(self, dsn, max_lag, check_interval, pool_min=4, pool_max=10):
+        self.dsn = dsn
+        self.pool_min = pool_min
+        self.pool_max = pool_max
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.pool = None
+        self.pool_lock = threading.Lock()
+        self.state_lock = threading.Lock()
+        self.healthy = True
+        self.lag = 0
+        self.checked_at = 0
+    
+    def get_pool(self, reserve=False):
+        with self.pool_lock:
+            if self.pool is None:
+                self.pool = psycopg2.pool.ThreadedConnectionPool(
+                    self.pool_min,
+                    self.pool_max,
+                    dsn=self.dsn,
+                    connect_timeout=int(os.getenv('DB_CONNECT_TIMEOUT', '10')),
+                    connection_factory=StatementConnection
+                )
+                self.pool.in_use = 0
+                self.pool.retired = False
+            if reserve:
+                self.pool.in_use += 1
+            return self.pool
+    
+    def acquire(self):
+        with self.state_lock:
+            now = time.monotonic()
+            due = now - self.checked_at >= self.check_interval
+            if not self.healthy and not due:
+                return None
+            if due:
+                self.checked_at = now
+        
+        pool = connection = None
+        try:
+            pool = self.get_pool(reserve=True)
+            connection = pool.getconn()
+            connection.origin_pool = pool
+            if not connection.autocommit:
+                connection.set_session(readonly=True, autocommit=True)
+            
+            if due:
+                lag = self.measure_lag(connection)
+                with self.state_lock:
+                    self.lag = lag
+                    was_healthy = self.healthy
+                    self.healthy = lag <= self.max_lag
+                if self.healthy != was_healthy:
+                    print(f"Replica {self.describe()} {'recovered' if self.healthy else 'lagging'}: {lag:.1f}s behind")
+                if not self.healthy:
+                    self.release(connection)
+                    return None
+            
+            return connection
+        except Error as e:
+            if connection is not None:
+                self.release(connection, close=True)
+            elif pool is not None:
+                self._unreserve(pool)
+            if self.healthy:
+                print(f"Replica {self.describe()} unavailable: {e}")
+            self.mark_failed()
+            return None
+    
+    def release(self, connection, close=False):
+        pool = getattr(connection, 'origin_pool', None)
+        if pool is None:
+            connection.close()
+            return
+        connection.origin_pool = None
+        try:
+            if not pool.closed:
+                pool.putconn(connection, close=close or pool.retired or bool(connection.closed))
+            else:
+                connection.close()
+        except Error as e:
+            print(f"Error returning replica connection: {e}")
+        self._unreserve(pool)
+    
+    def _unreserve(self, pool):
+        with self.pool_lock:
+            pool.in_use -= 1
+            drain = pool.retired and pool.in_use == 0
+        if drain:
+            pool.closeall()
+    
+    def mark_failed(self):
+        with self.state_lock:
+            self.healthy = False
+            self.checked_at = time.monotonic()
+        self.retire()
+    
+    def retire(self):
+        with self.pool_lock:
+            pool, self.pool = self.pool, None
+            if pool is None:
+                return
+            pool.retired = True
+            drain = pool.in_use == 0
+        if drain:
+            pool.closeall()
+    
+    def measure_lag(self, connection):
+        cursor = connection.cursor()
+        cursor.execute("""
+            SELECT CASE
+                WHEN NOT pg_is_in_recovery() THEN 0
+                WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+            END
+        """)
+        lag = float(cursor.fetchone()[0])
+        cursor.close()
+        return lag
+    
+    def describe(self):
+        params = psycopg2.extensions.parse_dsn(self.dsn)
+        return f"{params.get('host', 'localhost')}:{params.get('port', '5432')}"
+    
+    def close(self):
+        with self.pool_lock:
+            pool, self.pool = self.pool, None
+        if pool:
+            pool.closeall()
+
 class DatabaseManager:
-    def __init__(self):
+    def __init__(self, dsn=None, replica_dsns=None, session_workers=0):
         self.connection = None
+        self.dsn = dsn or os.getenv('DB_DSN') or None
+        self.pool_min = int(os.getenv('DB_POOL_MIN', '4'))
+        self.pool_max = int(os.getenv('DB_POOL_MAX', '10'))
+        required = session_workers + int(os.getenv('DB_POOL_RESERVE', '3'))
+        if self.pool_max < required:
+            print(f"DB_POOL_MAX={self.pool_max} cannot serve {session_workers} update workers plus background jobs, using {required} connections")
+            self.pool_max = required
+        self.pool_min = min(self.pool_min, self.pool_max)
+        if replica_dsns is None:
+            replica_dsns = [item.strip() for item in os.getenv('DB_REPLICA_DSNS', '').split(',') if item.strip()]
+        self.replicas = [
+            ReplicaPool(
+                replica_dsn,
+                float(os.getenv('DB_REPLICA_MAX_LAG', '5')),
+                float(os.getenv('DB_REPLICA_CHECK_INTERVAL', '5')),
+                self.pool_min,
+                self.pool_max
+            )
+            for replica_dsn in replica_dsns
+        ]
+        self.replica_counter = itertools.count()
+        self.query_listeners = []
+        self.use_prepared = os.getenv('DB_PREPARED_STATEMENTS', '1') == '1'
+        self.unpreparable = set()
+        self.stats_partitions = int(os.getenv('DB_STATS_PARTITIONS', '8'))
+        self.event_partitions_ahead = int(os.getenv('EVENT_PARTITIONS_AHEAD', '2'))
+        self.dedupe_batch_size = int(os.getenv('WORD_DEDUPE_BATCH_SIZE', '500'))
+        self.read_retries = int(os.getenv('DB_READ_RETRIES', '2'))
+        self.reconnect_base_delay = float(os.getenv('DB_RECONNECT_BASE_DELAY', '0.5'))
+        self.reconnect_max_delay = float(os.getenv('DB_RECONNECT_MAX_DELAY', '30'))
+        self.health_check_interval = float(os.getenv('DB_HEALTH_CHECK_INTERVAL', '30'))
+        self.reconnect_lock = threading.Lock()
+        self.reconnect_failures = 0
+        self.reconnect_at = 0
+        self.pool = None
+        self.pool_lock = threading.Lock()
+        self.local = threading.local()
+        self.session_connections = {}
         self.connect()
         self.create_tables()
         self.initialize_words()
     
+    def connection_params(self):
+        if self.dsn:
+            return {
+                'dsn': self.dsn,
+                'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '10')),
+                'connection_factory': StatementConnection
+            }
+        return {
+            'host': os.getenv('DB_HOST', 'localhost'),
+            'database': os.getenv('DB_NAME', 'english_bot'),
+            'user': os.getenv('DB_USER', 'postgres'),
+            'password': os.getenv('DB_PASSWORD', 'password'),
+            'port': os.getenv('DB_PORT', '5432'),
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '10')),
+            'connection_factory': StatementConnection
+        }
+    
+    def open_connection(self):
+        return psycopg2.connect(**self.connection_params())
+    
     def connect(self):
         try:
-            self.connection = psycopg2.connect(
-                host=os.getenv('DB_HOST', 'localhost'),
-                database=os.getenv('DB_NAME', 'english_bot'),
-                user=os.getenv('DB_USER', 'postgres'),
-                password=os.getenv('DB_PASSWORD', 'password'),
-                port=os.getenv('DB_PORT', '5432')
-            )
+            self.connection = self.open_connection()
             print("Database connection established successfully")
         except Error as e:
             print(f"Database connection error: {e}")
+            raise
+    
+    def _backoff_delay(self, attempt):
+        return random.uniform(0, min(self.reconnect_max_delay, self.reconnect_base_delay * 2 ** attempt))
+    
+    def _check_backoff(self):
+        now = time.monotonic()
+        if now < self.reconnect_at:
+            raise psycopg2.OperationalError(f"Database unavailable, next reconnect attempt in {self.reconnect_at - now:.1f}s")
+    
+    def _connect_failed(self, error):
+        self.reconnect_failures += 1
+        self.reconnect_at = time.monotonic() + self._backoff_delay(self.reconnect_failures)
+        print(f"Database reconnect failed ({self.reconnect_failures} in a row): {error}")
+    
+    def _connect_succeeded(self):
+        self.reconnect_failures = 0
+        self.reconnect_at = 0
+    
+    def _reconnect(self):
+        with self.reconnect_lock:
+            connection = self.connection
+            if connection is not None and not connection.closed:
+                return connection
+            
+            self._check_backoff()
+            try:
+                self.connection = self.open_connection()
+            except Error as e:
+                self._connect_failed(e)
+                raise
+            
+            self._connect_succeeded()
+            print("Database connection re-established")
+            return self.connection
+    
+    def _healthy(self, connection):
+        if connection.closed:
+            return False
+        if time.monotonic() - getattr(connection, 'checked_at', 0) < self.health_check_interval:
+            return True
+        if connection.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return True
+        
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            if not connection.autocommit:
+                connection.rollback()
+        except Error as e:
+            print(f"Database health check failed: {e}")
+            return False
+        connection.checked_at = time.monotonic()
+        return True
+    
+    def _pool_connection(self):
+        self._check_backoff()
+        try:
+            pool = self.get_pool()
+            for _ in range(pool.maxconn):
+                connection = pool.getconn()
+                if self._healthy(connection):
+                    break
+                pool.putconn(connection, close=True)
+            else:
+                connection = pool.getconn()
+        except CONNECTION_ERRORS as e:
+            with self.reconnect_lock:
+                self._connect_failed(e)
+            raise
+        if self.reconnect_failures:
+            with self.reconnect_lock:
+                self._connect_succeeded()
+            print("Database pool connection re-established")
+        return connection
+    
+    def _recover(self, connection, error):
+        lost = bool(connection.closed) or isinstance(error, psycopg2.InterfaceError)
+        in_session = getattr(self.local, 'depth', 0) and connection is getattr(self.local, 'connection', None)
+        
+        if lost:
+            self.local.disconnected = True
+            if connection is self.connection:
+                with self.reconnect_lock:
+                    if connection is self.connection:
+                        self.connection = None
+                connection.close()
+                print(f"Database connection lost: {error}")
+            elif in_session and not self.local.wrote:
+                self.local.connection = None
+                self.session_connections.pop(threading.get_ident(), None)
+                self.get_pool().putconn(connection, close=True)
+            return
+        
+        if connection.autocommit:
+            return
+        try:
+            if in_session:
+                cursor = connection.cursor()
+                cursor.execute(f"ROLLBACK TO SAVEPOINT {SESSION_SAVEPOINT}")
+                cursor.close()
+            else:
+                connection.rollback()
+        except Error as e:
+            print(f"Error rolling back failed statement: {e}")
+    
+    def _set_session_savepoint(self, connection):
+        cursor = connection.cursor()
+        cursor.execute(f"SAVEPOINT {SESSION_SAVEPOINT}")
+        cursor.close()
+    
+    def get_pool(self):
+        with self.pool_lock:
+            if self.pool is None:
+                self.pool = psycopg2.pool.ThreadedConnectionPool(
+                    self.pool_min,
+                    self.pool_max,
+                    **self.connection_params()
+                )
+            return self.pool
+    
+    def begin_session(self):
+        if getattr(self.local, 'depth', 0):
+            self.local.depth += 1
+            return
+        self.local.depth = 1
+        self.local.connection = None
+        self.local.wrote = False
+    
+    def end_session(self, commit=True):
+        depth = getattr(self.local, 'depth', 0)
+        if depth > 1:
+            self.local.depth -= 1
+            return
+        
+        connection = getattr(self.local, 'connection', None)
+        self.local.depth = 0
+        self.local.connection = None
+        self.local.wrote = False
+        if connection is None:
+            return
+        self.session_connections.pop(threading.get_ident(), None)
+        
+        try:
+            if commit:
+                connection.commit()
+            else:
+                connection.rollback()
+        finally:
+            self.get_pool().putconn(connection, close=bool(connection.closed))
+    
+    @contextmanager
+    def session(self):
+        self.begin_session()
+        try:
+            yield self
+        except Exception:
+            self.end_session(commit=False)
+            raise
+        self.end_session()
+    
+    def _current_connection(self):
+        try:
+            if not getattr(self.local, 'depth', 0):
+                connection = self.connection
+                if connection is None or connection.closed:
+                    connection = self._reconnect()
+                return connection
+            if self.local.connection is None:
+                connection = self._pool_connection()
+                try:
+                    self._set_session_savepoint(connection)
+                except Error:
+                    self.get_pool().putconn(connection, close=True)
+                    raise
+                self.local.connection = connection
+                self.session_connections[threading.get_ident()] = connection
+            return self.local.connection
+        except CONNECTION_ERRORS:
+            self.local.disconnected = True
+            raise
+    
+    def cancel_queries(self, thread_id):
+        connection = self.session_connections.get(thread_id) or self.connection
+        if connection is not None and not connection.closed:
+            connection.cancel()
+    
+    def _cursor(self, **kwargs):
+        return self._current_connection().cursor(**kwargs)
+    
+    def _commit(self):
+        if getattr(self.local, 'depth', 0):
+            connection = self.local.connection
+            if connection is not None:
+                try:
+                    self._set_session_savepoint(connection)
+                except Error as e:
+                    self._recover(connection, e)
+                    raise
+            self.local.wrote = True
+            return
+        connection = self.connection
+        try:
+            connection.commit()
+        except Error as e:
+            self._recover(connection, e)
+            raise
+    
+    def _acquire_replica(self):
+        if not self.replicas or getattr(self.local, 'wrote', False):
+            return None, None
+        
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[next(self.replica_counter) % len(self.replicas)]
+            connection = replica.acquire()
+            if connection is not None:
+                return replica, connection
+        return None, None
+    
+    @contextmanager
+    def _read_connection(self):
+        replica, connection = self._acquire_replica()
+        if connection is None:
+            yield self._current_connection()
+            return
+        
+        failed = False
+        try:
+            yield connection
+        except CONNECTION_ERRORS:
+            failed = True
+            replica.mark_failed()
+            raise
+        finally:
+            replica.release(connection, close=failed)
+    
+    def add_query_listener(self, listener):
+        self.query_listeners.append(listener)
+    
+    def _execute(self, cursor, query, params=None, source=None):
+        return self._instrument(source or query, params, lambda: cursor.execute(query, params), cursor.connection)
+    
+    def _instrument(self, query, params, run, connection=None):
+        started_at = time.perf_counter()
+        try:
+            return run()
+        except Error as e:
+            if connection is not None:
+                self._recover(connection, e)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started_at
+            for listener in self.query_listeners:
+                try:
+                    listener(query, params, elapsed)
+                except Exception as e:
+                    print(f"Query listener error: {e}")
+    
+    def _execute_prepared(self, cursor, name, query, params):
+        prepared = getattr(cursor.connection, 'prepared_statements', None)
+        if not self.use_prepared or prepared is None or name in self.unpreparable:
+            return self._execute(cursor, query, params)
+        
+        if name not in prepared:
+            with cursor.connection.prepare_lock:
+                if name not in prepared and not self._prepare(cursor, name, query):
+                    return self._execute(cursor, query, params)
+        
+        placeholders = ', '.join(['%s'] * len(params))
+        try:
+            return self._execute(cursor, f"EXECUTE {name} ({placeholders})", params, source=query)
+        except InvalidSqlStatementName:
+            with cursor.connection.prepare_lock:
+                prepared.clear()
+            raise
+    
+    def _prepare(self, cursor, name, query):
+        position = itertools.count(1)
+        statement = re.sub(r'%s', lambda match: f"${next(position)}", query)
+        
+        try:
+            if cursor.connection.autocommit:
+                cursor.execute(f"PREPARE {name} AS {statement}")
+            else:
+                cursor.execute(f"SAVEPOINT prepare_{name}")
+                cursor.execute(f"PREPARE {name} AS {statement}")
+                cursor.execute(f"RELEASE SAVEPOINT prepare_{name}")
+            cursor.connection.prepared_statements.add(name)
+            return True
+        except CONNECTION_ERRORS as e:
+            self._recover(cursor.connection, e)
+            raise
+        except Error as e:
+            if not cursor.connection.autocommit:
+                cursor.execute(f"ROLLBACK TO SAVEPOINT prepare_{name}")
+            if isinstance(e, DuplicatePreparedStatement):
+                cursor.connection.prepared_statements.add(name)
+                return True
+            if isinstance(e, UNPREPARABLE_ERRORS):
+                self.unpreparable.add(name)
+                print(f"Could not prepare statement {name}, using plain query: {e}")
+            else:
+                print(f"Could not prepare statement {name} this time, using plain query: {e}")
+            return False
+    
+    def _relkind(self, cursor, table):
+        self._execute(cursor, "SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    
+    def _event_partitions(self, cursor):
+        self._execute(cursor, """
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'quiz_events'::regclass
+            ORDER BY c.relname
+        """)
+        return [row[0] for row in cursor.fetchall()]
+    
+    def _create_event_partitions(self, cursor, first_month):
+        existing = set(self._event_partitions(cursor))
+        month = first_month.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        last_month = datetime.now()
+        for _ in range(self.event_partitions_ahead):
+            last_month = (last_month.replace(day=1) + timedelta(days=32)).replace(day=1)
+        
+        created = 0
+        while month <= last_month:
+            next_month = (month + timedelta(days=32)).replace(day=1)
+            name = f"quiz_events_{month:%Y%m}"
+            if name not in existing:
+                self._execute(cursor, f"""
+                    CREATE TABLE {name} PARTITION OF quiz_events
+                    FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month:%Y-%m-%d}')
+                """)
+                created += 1
+            month = next_month
+        return created
+    
+    def _create_word_key_index(self, cursor, table, word_type, index, columns, replaces=None):
+        self._execute(cursor, "SELECT to_regclass(%s)", (index,))
+        if cursor.fetchone()[0] is not None:
+            return
+        
+        removed = 0
+        while True:
+            self._execute(cursor, f"""
+                SELECT id, keep_id, user_id FROM (
+                    SELECT id, {'user_id' if word_type == 'user' else 'NULL::BIGINT AS user_id'},
+                        first_value(id) OVER (PARTITION BY {columns} ORDER BY id DESC) AS keep_id
+                    FROM {table}
+                    WHERE ({columns}) IN (
+                        SELECT {columns} FROM {table}
+                        GROUP BY {columns}
+                        HAVING COUNT(*) > 1
+                        LIMIT %s
+                    )
+                ) AS duplicates
+                WHERE id != keep_id
+            """, (self.dedupe_batch_size,))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            
+            ids = [row[0] for row in rows]
+            keep_ids = [row[1] for row in rows]
+            self._execute(cursor, """
+                INSERT INTO learning_stats (user_id, word_id, word_type, correct_answers, wrong_answers, last_practiced)
+                SELECT s.user_id, d.keep_id, s.word_type, SUM(s.correct_answers), SUM(s.wrong_answers), MAX(s.last_practiced)
+                FROM learning_stats s
+                JOIN unnest(%s::INTEGER[], %s::INTEGER[]) AS d(id, keep_id) ON s.word_id = d.id
+                WHERE s.word_type = %s
+                GROUP BY s.user_id, d.keep_id, s.word_type
+                ON CONFLICT (user_id, word_id, word_type) DO UPDATE SET
+                    correct_answers = learning_stats.correct_answers + EXCLUDED.correct_answers,
+                    wrong_answers = learning_stats.wrong_answers + EXCLUDED.wrong_answers,
+                    last_practiced = GREATEST(learning_stats.last_practiced, EXCLUDED.last_practiced)
+            """, (ids, keep_ids, word_type))
+            self._execute(cursor, "DELETE FROM learning_stats WHERE word_type = %s AND word_id = ANY(%s)", (word_type, ids))
+            self._execute(cursor, """
+                UPDATE quiz_events SET word_id = d.keep_id
+                FROM unnest(%s::INTEGER[], %s::INTEGER[]) AS d(id, keep_id)
+                WHERE quiz_events.word_type = %s AND quiz_events.word_id = d.id
+            """, (ids, keep_ids, word_type))
+            self._execute(cursor, f"DELETE FROM {table} WHERE id = ANY(%s)", (ids,))
+            self._commit()
+            removed += len(ids)
+        
+        if removed:
+            print(f"Merged {removed} duplicate rows in {table}")
+        self._execute(cursor, f"CREATE UNIQUE INDEX IF NOT EXISTS {index} ON {table} ({columns})")
+        if replaces:
+            self._execute(cursor, f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {replaces}")
     
     def create_tables(self):
         try:
-            cursor = self.connection.cursor()
+            cursor = self._cursor()
             
-            cursor.execute("""
+            self._execute(cursor, """
                 CREATE TABLE IF NOT EXISTS users (
                     user_id BIGINT PRIMARY KEY,
                     username VARCHAR(255),
                     first_name VARCHAR(255),
                     last_name VARCHAR(255),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
             
-            cursor.execute("""
+            self._execute(cursor, """
                 CREATE TABLE IF NOT EXISTS common_words (
                     id SERIAL PRIMARY KEY,
                     english_word VARCHAR(255) UNIQUE NOT NULL,
@@ -50,30 +668,165 @@ class DatabaseManager:
                 )
             """)
             
-            cursor.execute("""
+            self._execute(cursor, """
                 CREATE TABLE IF NOT EXISTS user_words (
                     id SERIAL PRIMARY KEY,
                     user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
                     english_word VARCHAR(255) NOT NULL,
                     translation_word VARCHAR(255) NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(user_id, english_word)
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
             
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS learning_stats (
-                    id SERIAL PRIMARY KEY,
+            self._execute(cursor, "CREATE INDEX IF NOT EXISTS idx_common_words_category ON common_words (category)")
+            
+            self._execute(cursor, "SELECT prosrc FROM pg_proc WHERE proname = 'word_key'")
+            row = cursor.fetchone()
+            if row and WORD_KEY_SQL not in row[0]:
+                self._execute(cursor, "DROP FUNCTION word_key(TEXT) CASCADE")
+                print("word_key definition changed, rebuilding word key indexes")
+            self._execute(cursor, f"""
+                CREATE OR REPLACE FUNCTION word_key(word TEXT) RETURNS TEXT AS $$
+                    SELECT {WORD_KEY_SQL}
+                $$ LANGUAGE SQL IMMUTABLE STRICT PARALLEL SAFE
+            """)
+            
+            self._execute(cursor, """
+                CREATE TABLE IF NOT EXISTS user_categories (
                     user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
-                    word_id INTEGER,
-                    word_type VARCHAR(20),
-                    correct_answers INTEGER DEFAULT 0,
-                    wrong_answers INTEGER DEFAULT 0,
-                    last_practiced TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    category VARCHAR(100) NOT NULL,
+                    PRIMARY KEY (user_id, category)
+                )
+            """)
+            
+            self._execute(cursor, """
+                ALTER TABLE users ADD COLUMN IF NOT EXISTS last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            """)
+            self._execute(cursor, "CREATE INDEX IF NOT EXISTS idx_users_last_active ON users (last_active)")
+            
+            stats_kind = self._relkind(cursor, 'learning_stats')
+            if stats_kind == 'r':
+                self._execute(cursor, """
+                    CREATE TEMP TABLE learning_stats_migration ON COMMIT DROP AS
+                    SELECT user_id, word_id, word_type,
+                           SUM(COALESCE(correct_answers, 0)) AS correct_answers,
+                           SUM(COALESCE(wrong_answers, 0)) AS wrong_answers,
+                           MAX(last_practiced) AS last_practiced
+                    FROM learning_stats
+                    WHERE user_id IS NOT NULL
+                    GROUP BY user_id, word_id, word_type
+                """)
+                self._execute(cursor, "DROP TABLE learning_stats")
+            
+            if stats_kind != 'p':
+                self._execute(cursor, """
+                    CREATE TABLE learning_stats (
+                        id SERIAL,
+                        user_id BIGINT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+                        word_id INTEGER,
+                        word_type VARCHAR(20),
+                        correct_answers INTEGER DEFAULT 0,
+                        wrong_answers INTEGER DEFAULT 0,
+                        last_practiced TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (user_id, id),
+                        UNIQUE (user_id, word_id, word_type)
+                    ) PARTITION BY HASH (user_id)
+                """)
+                for remainder in range(self.stats_partitions):
+                    self._execute(cursor, f"""
+                        CREATE TABLE learning_stats_p{remainder} PARTITION OF learning_stats
+                        FOR VALUES WITH (MODULUS {self.stats_partitions}, REMAINDER {remainder})
+                    """)
+            
+            if stats_kind == 'r':
+                self._execute(cursor, """
+                    INSERT INTO learning_stats (user_id, word_id, word_type, correct_answers, wrong_answers, last_practiced)
+                    SELECT user_id, word_id, word_type, correct_answers, wrong_answers, last_practiced
+                    FROM learning_stats_migration
+                """)
+                print("Migrated learning_stats to a partitioned table")
+            
+            self._execute(cursor, """
+                CREATE TABLE IF NOT EXISTS broadcasts (
+                    id SERIAL PRIMARY KEY,
+                    message_text TEXT NOT NULL,
+                    status VARCHAR(20) DEFAULT 'pending',
+                    total_users INTEGER DEFAULT 0,
+                    last_user_id BIGINT DEFAULT 0,
+                    sent_count INTEGER DEFAULT 0,
+                    failed_count INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
+            events_kind = self._relkind(cursor, 'quiz_events')
+            if events_kind == 'r':
+                self._execute(cursor, """
+                    CREATE TEMP TABLE quiz_events_migration ON COMMIT DROP AS
+                    SELECT id, user_id, word_id, word_type, chosen_option, is_correct, latency_ms,
+                           COALESCE(created_at, LOCALTIMESTAMP) AS created_at
+                    FROM quiz_events
+                """)
+                self._execute(cursor, "DROP TABLE quiz_events")
+            
+            if events_kind != 'p':
+                self._execute(cursor, """
+                    CREATE TABLE quiz_events (
+                        id BIGSERIAL,
+                        user_id BIGINT NOT NULL,
+                        word_id INTEGER NOT NULL,
+                        word_type VARCHAR(20) NOT NULL,
+                        chosen_option VARCHAR(255),
+                        is_correct BOOLEAN NOT NULL,
+                        latency_ms INTEGER,
+                        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (id, created_at)
+                    ) PARTITION BY RANGE (created_at)
+                """)
+            
+            first_month = datetime.now()
+            if events_kind == 'r':
+                self._execute(cursor, "SELECT MIN(created_at) FROM quiz_events_migration")
+                first_month = min(first_month, cursor.fetchone()[0] or first_month)
+            self._create_event_partitions(cursor, first_month)
+            
+            if events_kind == 'r':
+                self._execute(cursor, """
+                    INSERT INTO quiz_events (id, user_id, word_id, word_type, chosen_option, is_correct, latency_ms, created_at)
+                    SELECT id, user_id, word_id, word_type, chosen_option, is_correct, latency_ms, created_at
+                    FROM quiz_events_migration
+                """)
+                self._execute(cursor, """
+                    SELECT setval(pg_get_serial_sequence('quiz_events', 'id'), COALESCE(MAX(id), 0) + 1, false)
+                    FROM quiz_events
+                """)
+                print("Migrated quiz_events to a partitioned table")
+            
+            self._execute(cursor, "CREATE INDEX IF NOT EXISTS idx_quiz_events_user ON quiz_events (user_id)")
+            
+            self._execute(cursor, """
+                CREATE TABLE IF NOT EXISTS quiz_event_compaction (
+                    id INTEGER PRIMARY KEY,
+                    last_event_id BIGINT NOT NULL DEFAULT 0,
+                    compacted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
             
-            self.connection.commit()
+            self._execute(cursor, """
+                INSERT INTO quiz_event_compaction (id, last_event_id) VALUES (1, 0)
+                ON CONFLICT (id) DO NOTHING
+            """)
+            
+            self._commit()
+            
+            self._create_word_key_index(cursor, 'common_words', 'common', 'idx_common_words_key', 'word_key(english_word)')
+            self._create_word_key_index(
+                cursor, 'user_words', 'user', 'idx_user_words_key', 'user_id, word_key(english_word)',
+                replaces='user_words_user_id_english_word_key'
+            )
+            self._commit()
+            
             cursor.close()
             print("Tables created successfully")
             
@@ -82,9 +835,9 @@ class DatabaseManager:
     
     def initialize_words(self):
         try:
-            cursor = self.connection.cursor()
+            cursor = self._cursor()
             
-            cursor.execute("SELECT COUNT(*) FROM common_words")
+            self._execute(cursor, "SELECT COUNT(*) FROM common_words")
             count = cursor.fetchone()[0]
             
             if count == 0:
@@ -106,14 +859,11 @@ class DatabaseManager:
                     ('We', 'We', 'Pronouns')
                 ]
                 
-                cursor.executemany(
-                    "INSERT INTO common_words (english_word, translation_word, category) VALUES (%s, %s, %s)",
-                    basic_words
-                )
-                
-                self.connection.commit()
+                query = "INSERT INTO common_words (english_word, translation_word, category) VALUES (%s, %s, %s)"
+                self._instrument(query, basic_words, lambda: cursor.executemany(query, basic_words), cursor.connection)
                 print(f"Added {len(basic_words)} basic words")
             
+            self._commit()
             cursor.close()
             
         except Error as e:
@@ -121,124 +871,266 @@ class DatabaseManager:
     
     def add_user(self, user_id, username, first_name, last_name):
         try:
-            cursor = self.connection.cursor()
-            cursor.execute("""
+            cursor = self._cursor()
+            self._execute_prepared(cursor, 'add_user', """
                 INSERT INTO users (user_id, username, first_name, last_name)
                 VALUES (%s, %s, %s, %s)
                 ON CONFLICT (user_id) DO UPDATE SET
                 username = EXCLUDED.username,
                 first_name = EXCLUDED.first_name,
-                last_name = EXCLUDED.last_name
+                last_name = EXCLUDED.last_name,
+                last_active = CURRENT_TIMESTAMP
             """, (user_id, username, first_name, last_name))
-            self.connection.commit()
+            self._commit()
             cursor.close()
             return True
         except Error as e:
             print(f"Error adding user: {e}")
             return False
     
-    def get_random_word(self, user_id):
-        try:
-            cursor = self.connection.cursor()
-            
-            cursor.execute("""
-                SELECT 
-                    CASE 
-                        WHEN uw.id IS NOT NULL THEN 'user'
-                        ELSE 'common'
-                    END as word_type,
-                    COALESCE(uw.english_word, cw.english_word) as english_word,
-                    COALESCE(uw.translation_word, cw.translation_word) as translation_word,
-                    COALESCE(uw.id, cw.id) as word_id
-                FROM (
-                    SELECT id, english_word, translation_word, created_at, NULL as user_id FROM common_words 
-                    UNION ALL 
-                    SELECT id, english_word, translation_word, created_at, user_id FROM user_words 
-                    WHERE user_id = %s
-                ) AS all_words
-                LEFT JOIN user_words uw ON all_words.id = uw.id AND all_words.user_id = uw.user_id
-                LEFT JOIN common_words cw ON all_words.id = cw.id
-                ORDER BY RANDOM()
-                LIMIT 1
-            """, (user_id,))
-            
-            result = cursor.fetchone()
+    def _category_params(self, user_id, categories):
+        common = [category for category in categories if category != USER_WORDS_CATEGORY]
+        return (common, user_id, USER_WORDS_CATEGORY in categories)
+    
+    @retry_read
+    def get_categories(self):
+        try:
+            with self._read_connection() as connection:
+                cursor = connection.cursor()
+                self._execute(cursor, """
+                    SELECT category, COUNT(*) FROM common_words
+                    WHERE category IS NOT NULL
+                    GROUP BY category
+                    ORDER BY category
+                """)
+                categories = cursor.fetchall()
+                cursor.close()
+                return categories
+        except Error as e:
+            print(f"Error getting categories: {e}")
+            return []
+    
+    @retry_read
+    def get_user_categories(self, user_id):
+        try:
+            cursor = self._cursor()
+            self._execute(cursor, "SELECT category FROM user_categories WHERE user_id = %s ORDER BY category", (user_id,))
+            categories = [row[0] for row in cursor.fetchall()]
             cursor.close()
-            
-            if result:
-                return {
-                    'word_type': result[0],
-                    'english_word': result[1],
-                    'translation_word': result[2],
-                    'word_id': result[3]
-                }
+            return categories
+        except Error as e:
+            print(f"Error getting user categories: {e}")
             return None
+    
+    def set_user_categories(self, user_id, categories):
+        try:
+            cursor = self._cursor()
+            self._execute(cursor, "DELETE FROM user_categories WHERE user_id = %s", (user_id,))
+            if categories:
+                query = "INSERT INTO user_categories (user_id, category) VALUES %s"
+                rows = [(user_id, category) for category in categories]
+                self._instrument(query, rows, lambda: psycopg2.extras.execute_values(cursor, query, rows), cursor.connection)
+            self._commit()
+            cursor.close()
+            return True
+        except Error as e:
+            print(f"Error saving user categories: {e}")
+            return False
+    
+    @retry_read
+    def get_random_word(self, user_id, categories=None):
+        try:
+            with self._read_connection() as connection:
+                cursor = connection.cursor()
+            
+                if categories:
+                    self._execute_prepared(cursor, 'random_word_category', """
+                        SELECT word_type, english_word, translation_word, word_id FROM (
+                            SELECT 'common' AS word_type, english_word, translation_word, id AS word_id
+                            FROM common_words WHERE category = ANY(%s)
+                            UNION ALL
+                            SELECT 'user', english_word, translation_word, id
+                            FROM user_words WHERE user_id = %s AND %s
+                        ) AS pool
+                        ORDER BY RANDOM()
+                        LIMIT 1
+                    """, self._category_params(user_id, categories))
+                else:
+                    self._execute_prepared(cursor, 'random_word', """
+                        SELECT 
+                            CASE 
+                                WHEN uw.id IS NOT NULL THEN 'user'
+                                ELSE 'common'
+                            END as word_type,
+                            COALESCE(uw.english_word, cw.english_word) as english_word,
+                            COALESCE(uw.translation_word, cw.translation_word) as translation_word,
+                            COALESCE(uw.id, cw.id) as word_id
+                        FROM (
+                            SELECT id, english_word, translation_word, created_at, NULL as user_id FROM common_words 
+                            UNION ALL 
+                            SELECT id, english_word, translation_word, created_at, user_id FROM user_words 
+                            WHERE user_id = %s
+                        ) AS all_words
+                        LEFT JOIN user_words uw ON all_words.id = uw.id AND all_words.user_id = uw.user_id
+                        LEFT JOIN common_words cw ON all_words.id = cw.id
+                        ORDER BY RANDOM()
+                        LIMIT 1
+                    """, (user_id,))
+            
+                result = cursor.fetchone()
+                cursor.close()
+            
+                if result:
+                    return {
+                        'word_type': result[0],
+                        'english_word': result[1],
+                        'translation_word': result[2],
+                        'word_id': result[3]
+                    }
+                return None
             
         except Error as e:
             print(f"Error getting random word: {e}")
             return None
     
-    def get_random_words_for_quiz(self, user_id, target_word, count=3):
+    @retry_read
+    def get_random_words_for_quiz(self, user_id, target_word, count=3, categories=None):
         try:
-            cursor = self.connection.cursor()
+            with self._read_connection() as connection:
+                cursor = connection.cursor()
             
-            cursor.execute("""
-                SELECT english_word FROM (
-                    SELECT english_word FROM common_words 
-                    UNION ALL 
-                    SELECT english_word FROM user_words WHERE user_id = %s
-                ) AS all_words
-                WHERE english_word != %s
-                ORDER BY RANDOM()
-                LIMIT %s
-            """, (user_id, target_word, count))
+                if categories:
+                    self._execute_prepared(cursor, 'quiz_words_category', """
+                        SELECT english_word FROM (
+                            SELECT english_word FROM common_words WHERE category = ANY(%s)
+                            UNION ALL
+                            SELECT english_word FROM user_words WHERE user_id = %s AND %s
+                        ) AS pool
+                        WHERE word_key(english_word) != word_key(%s)
+                        ORDER BY RANDOM()
+                        LIMIT %s
+                    """, self._category_params(user_id, categories) + (target_word, count))
+                else:
+                    self._execute_prepared(cursor, 'quiz_words', """
+                        SELECT english_word FROM (
+                            SELECT english_word FROM common_words 
+                            UNION ALL 
+                            SELECT english_word FROM user_words WHERE user_id = %s
+                        ) AS all_words
+                        WHERE word_key(english_word) != word_key(%s)
+                        ORDER BY RANDOM()
+                        LIMIT %s
+                    """, (user_id, target_word, count))
             
-            words = [row[0] for row in cursor.fetchall()]
-            cursor.close()
-            return words
+                words = [row[0] for row in cursor.fetchall()]
+                cursor.close()
+                return words
             
         except Error as e:
             print(f"Error getting words for quiz: {e}")
             return []
     
+    @retry_read
     def get_random_words_for_quiz_with_translations(self, user_id, target_word, count=3):
         try:
-            cursor = self.connection.cursor()
-            
-            cursor.execute("""
-                SELECT translation_word FROM (
-                    SELECT translation_word FROM common_words 
-                    UNION ALL 
-                    SELECT translation_word FROM user_words WHERE user_id = %s
-                ) AS all_words
-                WHERE translation_word != (
-                    SELECT translation_word FROM common_words WHERE english_word = %s
-                    UNION ALL
-                    SELECT translation_word FROM user_words WHERE user_id = %s AND english_word = %s
-                    LIMIT 1
-                )
-                ORDER BY RANDOM()
-                LIMIT %s
-            """, (user_id, target_word, user_id, target_word, count))
+            with self._read_connection() as connection:
+                cursor = connection.cursor()
             
-            words = [row[0] for row in cursor.fetchall()]
-            cursor.close()
-            return words
+                self._execute_prepared(cursor, 'quiz_translations', """
+                    SELECT translation_word FROM (
+                        SELECT translation_word FROM common_words 
+                        UNION ALL 
+                        SELECT translation_word FROM user_words WHERE user_id = %s
+                    ) AS all_words
+                    WHERE translation_word != (
+                        SELECT translation_word FROM common_words WHERE word_key(english_word) = word_key(%s)
+                        UNION ALL
+                        SELECT translation_word FROM user_words WHERE user_id = %s AND word_key(english_word) = word_key(%s)
+                        LIMIT 1
+                    )
+                    ORDER BY RANDOM()
+                    LIMIT %s
+                """, (user_id, target_word, user_id, target_word, count))
+            
+                words = [row[0] for row in cursor.fetchall()]
+                cursor.close()
+                return words
             
         except Error as e:
             print(f"Error getting words for quiz with translations: {e}")
             return []
     
+    @retry_read
+    def get_quiz_round(self, user_id, size, option_count=3, categories=None):
+        if categories:
+            common, _, user_scope = self._category_params(user_id, categories)
+        else:
+            common, user_scope = [], True
+        
+        try:
+            with self._read_connection() as connection:
+                cursor = connection.cursor()
+            
+                self._execute_prepared(cursor, 'quiz_round', """
+                    WITH pool AS MATERIALIZED (
+                        SELECT 'common' AS word_type, id AS word_id, english_word, translation_word,
+                            (%s OR category = ANY(%s)) AS in_scope
+                        FROM common_words
+                        UNION ALL
+                        SELECT 'user', id, english_word, translation_word, %s
+                        FROM user_words WHERE user_id = %s
+                    ),
+                    options AS MATERIALIZED (
+                        SELECT word_key(english_word) AS key, MIN(english_word) AS english_word, bool_or(in_scope) AS in_scope
+                        FROM pool
+                        GROUP BY word_key(english_word)
+                    ),
+                    targets AS (
+                        SELECT * FROM (
+                            SELECT DISTINCT ON (word_key(english_word))
+                                word_type, word_id, english_word, translation_word, word_key(english_word) AS key
+                            FROM pool
+                            WHERE in_scope
+                            ORDER BY word_key(english_word), RANDOM()
+                        ) AS unique_words
+                        ORDER BY RANDOM()
+                        LIMIT %s
+                    )
+                    SELECT t.word_type, t.english_word, t.translation_word, t.word_id,
+                        ARRAY(
+                            SELECT o.english_word FROM options o
+                            WHERE o.key != t.key
+                            ORDER BY o.in_scope DESC, RANDOM()
+                            LIMIT %s
+                        )
+                    FROM targets t
+                """, (not categories, common, user_scope, user_id, size, option_count))
+            
+                cards = [{
+                    'word_type': row[0],
+                    'english_word': row[1],
+                    'translation_word': row[2],
+                    'word_id': row[3],
+                    'other_words': row[4]
+                } for row in cursor.fetchall()]
+                cursor.close()
+                return cards
+            
+        except Error as e:
+            print(f"Error getting quiz round: {e}")
+            return []
+    
     def add_user_word(self, user_id, english_word, translation_word):
         try:
-            cursor = self.connection.cursor()
-            cursor.execute("""
+            cursor = self._cursor()
+            self._execute_prepared(cursor, 'add_user_word', """
                 INSERT INTO user_words (user_id, english_word, translation_word)
                 VALUES (%s, %s, %s)
-                ON CONFLICT (user_id, english_word) DO UPDATE SET
+                ON CONFLICT (user_id, word_key(english_word)) DO UPDATE SET
+                english_word = EXCLUDED.english_word,
                 translation_word = EXCLUDED.translation_word
             """, (user_id, english_word, translation_word))
-            self.connection.commit()
+            self._commit()
             cursor.close()
             return True
         except Error as e:
@@ -247,115 +1139,399 @@ class DatabaseManager:
     
     def delete_user_word(self, user_id, english_word):
         try:
-            cursor = self.connection.cursor()
-            cursor.execute("""
+            cursor = self._cursor()
+            self._execute_prepared(cursor, 'delete_user_word', """
                 DELETE FROM user_words 
-                WHERE user_id = %s AND english_word = %s
+                WHERE user_id = %s AND word_key(english_word) = word_key(%s)
             """, (user_id, english_word))
-            self.connection.commit()
+            self._commit()
             cursor.close()
             return True
         except Error as e:
             print(f"Error deleting user word: {e}")
             return False
     
+    @retry_read
     def get_user_words_count(self, user_id):
         try:
-            cursor = self.connection.cursor()
-            cursor.execute("""
-                SELECT COUNT(*) FROM user_words WHERE user_id = %s
-            """, (user_id,))
-            count = cursor.fetchone()[0]
-            cursor.close()
-            return count
+            with self._read_connection() as connection:
+                cursor = connection.cursor()
+                self._execute_prepared(cursor, 'user_words_count', """
+                    SELECT COUNT(*) FROM user_words WHERE user_id = %s
+                """, (user_id,))
+                count = cursor.fetchone()[0]
+                cursor.close()
+                return count
         except Error as e:
             print(f"Error getting user word count: {e}")
             return 0
     
+    @retry_read
+    def get_server_info(self):
+        try:
+            cursor = self._cursor()
+            self._execute(cursor, "SELECT version()")
+            version = cursor.fetchone()[0]
+            self._execute(cursor, """
+                SELECT table_name FROM information_schema.tables
+                WHERE table_schema = 'public'
+                ORDER BY table_name
+            """)
+            tables = [row[0] for row in cursor.fetchall()]
+            cursor.close()
+            return version, tables
+        except Error as e:
+            print(f"Error getting server info: {e}")
+            return None
+    
     def get_database_stats(self):
         try:
-            cursor = self.connection.cursor()
+            with self._read_connection() as connection:
+                cursor = connection.cursor()
             
-            cursor.execute("SELECT COUNT(*) FROM common_words")
-            common_count = cursor.fetchone()[0]
+                self._execute(cursor, "SELECT COUNT(*) FROM common_words")
+                common_count = cursor.fetchone()[0]
             
-            cursor.execute("SELECT COUNT(*) FROM user_words")
-            user_count = cursor.fetchone()[0]
+                self._execute(cursor, "SELECT COUNT(*) FROM user_words")
+                user_count = cursor.fetchone()[0]
             
-            cursor.execute("SELECT COUNT(*) FROM users")
-            users_count = cursor.fetchone()[0]
+                self._execute(cursor, "SELECT COUNT(*) FROM users")
+                users_count = cursor.fetchone()[0]
             
-            cursor.close()
+                cursor.close()
             
-            return {
-                'common_words': common_count,
-                'user_words': user_count,
-                'users': users_count
-            }
+                return {
+                    'common_words': common_count,
+                    'user_words': user_count,
+                    'users': users_count
+                }
         except Error as e:
             print(f"Error getting database stats: {e}")
             return None
     
+    @retry_read
+    def get_common_words(self):
+        try:
+            with self._read_connection() as connection:
+                cursor = connection.cursor()
+                self._execute(cursor, "SELECT english_word, translation_word, category FROM common_words")
+                words = cursor.fetchall()
+                cursor.close()
+                return words
+        except Error as e:
+            print(f"Error getting common words: {e}")
+            return None
+    
+    @retry_read
     def get_user_words(self, user_id):
         try:
-            cursor = self.connection.cursor()
-            cursor.execute("""
-                SELECT english_word, translation_word FROM user_words 
-                WHERE user_id = %s 
-                ORDER BY created_at DESC
-            """, (user_id,))
-            words = cursor.fetchall()
-            cursor.close()
-            return words
+            with self._read_connection() as connection:
+                cursor = connection.cursor()
+                self._execute_prepared(cursor, 'user_words', """
+                    SELECT english_word, translation_word FROM user_words 
+                    WHERE user_id = %s 
+                    ORDER BY created_at DESC
+                """, (user_id,))
+                words = cursor.fetchall()
+                cursor.close()
+                return words
         except Error as e:
             print(f"Error getting user words: {e}")
             return []
     
-    def update_learning_stats(self, user_id, word_id, word_type, is_correct):
+    def copy_quiz_events(self, events):
         try:
-            cursor = self.connection.cursor()
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerows(events)
+            buffer.seek(0)
             
-            cursor.execute("""
-                SELECT id FROM learning_stats 
-                WHERE user_id = %s AND word_id = %s AND word_type = %s
-            """, (user_id, word_id, word_type))
+            cursor = self._cursor()
+            query = """
+                COPY quiz_events (user_id, word_id, word_type, chosen_option, is_correct, latency_ms, created_at)
+                FROM STDIN WITH (FORMAT csv)
+            """
+            self._instrument(query, None, lambda: cursor.copy_expert(query, buffer), cursor.connection)
+            self._commit()
+            cursor.close()
+            return True
+        except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+            print(f"Quiz events rejected: {e}")
+            return None
+        except Error as e:
+            print(f"Error writing quiz events: {e}")
+            return False
+    
+    def compact_learning_stats(self, batch_size=10000):
+        try:
+            cursor = self._cursor()
+            
+            self._execute(cursor, """
+                SELECT last_event_id FROM quiz_event_compaction WHERE id = 1 FOR UPDATE
+            """)
+            last_event_id = cursor.fetchone()[0]
             
-            existing = cursor.fetchone()
+            self._execute(cursor, """
+                SELECT MAX(id), COUNT(*) FROM (
+                    SELECT id FROM quiz_events
+                    WHERE id > %s
+                    ORDER BY id
+                    LIMIT %s
+                ) AS batch
+            """, (last_event_id, batch_size))
+            upper_event_id, event_count = cursor.fetchone()
             
-            if existing:
-                if is_correct:
-                    cursor.execute("""
-                        UPDATE learning_stats 
-                        SET correct_answers = correct_answers + 1, last_practiced = CURRENT_TIMESTAMP
-                        WHERE id = %s
-                    """, (existing[0],))
-                else:
-                    cursor.execute("""
-                        UPDATE learning_stats 
-                        SET wrong_answers = wrong_answers + 1, last_practiced = CURRENT_TIMESTAMP
-                        WHERE id = %s
-                    """, (existing[0],))
-            else:
-                if is_correct:
-                    cursor.execute("""
-                        INSERT INTO learning_stats (user_id, word_id, word_type, correct_answers)
-                        VALUES (%s, %s, %s, 1)
-                    """, (user_id, word_id, word_type))
-                else:
-                    cursor.execute("""
-                        INSERT INTO learning_stats (user_id, word_id, word_type, wrong_answers)
-                        VALUES (%s, %s, %s, 1)
-                    """, (user_id, word_id, word_type))
+            if event_count:
+                self._execute(cursor, """
+                    INSERT INTO learning_stats (user_id, word_id, word_type, correct_answers, wrong_answers, last_practiced)
+                    SELECT user_id, word_id, word_type,
+                           COUNT(*) FILTER (WHERE is_correct),
+                           COUNT(*) FILTER (WHERE NOT is_correct),
+                           MAX(created_at)
+                    FROM quiz_events
+                    WHERE id > %s AND id <= %s
+                      AND EXISTS (SELECT 1 FROM users u WHERE u.user_id = quiz_events.user_id)
+                    GROUP BY user_id, word_id, word_type
+                    ON CONFLICT (user_id, word_id, word_type) DO UPDATE SET
+                    correct_answers = learning_stats.correct_answers + EXCLUDED.correct_answers,
+                    wrong_answers = learning_stats.wrong_answers + EXCLUDED.wrong_answers,
+                    last_practiced = GREATEST(learning_stats.last_practiced, EXCLUDED.last_practiced)
+                """, (last_event_id, upper_event_id))
+                
+                self._execute(cursor, """
+                    UPDATE users u
+                    SET last_active = GREATEST(u.last_active, e.last_answer)
+                    FROM (
+                        SELECT user_id, MAX(created_at) AS last_answer
+                        FROM quiz_events
+                        WHERE id > %s AND id <= %s
+                        GROUP BY user_id
+                    ) e
+                    WHERE u.user_id = e.user_id
+                """, (last_event_id, upper_event_id))
+                
+                self._execute(cursor, """
+                    UPDATE quiz_event_compaction
+                    SET last_event_id = %s, compacted_at = CURRENT_TIMESTAMP
+                    WHERE id = 1
+                """, (upper_event_id,))
             
-            self.connection.commit()
+            self._commit()
             cursor.close()
-            return True
+            return event_count
+        except Error as e:
+            print(f"Error compacting learning stats: {e}")
+            return 0
+    
+    def ensure_event_partitions(self):
+        try:
+            cursor = self._cursor()
+            created = self._create_event_partitions(cursor, datetime.now())
+            self._commit()
+            cursor.close()
+            return created
+        except Error as e:
+            print(f"Error creating quiz event partitions: {e}")
+            return 0
+    
+    def expired_event_partitions(self, retention_days):
+        cutoff = datetime.now() - timedelta(days=retention_days)
+        try:
+            cursor = self._cursor()
+            self._execute(cursor, "SELECT last_event_id FROM quiz_event_compaction WHERE id = 1")
+            last_event_id = cursor.fetchone()[0]
             
+            expired = []
+            for name in self._event_partitions(cursor):
+                try:
+                    month = datetime.strptime(name[len('quiz_events_'):], '%Y%m')
+                except ValueError:
+                    continue
+                if (month + timedelta(days=32)).replace(day=1) > cutoff:
+                    continue
+                
+                self._execute(cursor, f"SELECT EXISTS (SELECT 1 FROM {name} WHERE id > %s)", (last_event_id,))
+                if cursor.fetchone()[0]:
+                    print(f"Keeping {name}: it still has events that are not compacted")
+                    continue
+                expired.append(name)
+            
+            cursor.close()
+            return expired
+        except Error as e:
+            print(f"Error finding expired quiz event partitions: {e}")
+            return []
+    
+    def remove_event_partition(self, name, archive=False, lock_timeout=2):
+        try:
+            cursor = self._cursor()
+            self._execute(cursor, "SELECT set_config('lock_timeout', %s, true)", (f"{int(lock_timeout * 1000)}ms",))
+            if archive:
+                self._execute(cursor, f"ALTER TABLE quiz_events DETACH PARTITION {name}")
+            else:
+                self._execute(cursor, f"DROP TABLE {name}")
+            self._commit()
+            cursor.close()
+            return True
+        except Error as e:
+            print(f"Error removing quiz event partition {name}: {e}")
+            return False
+    
+    def touch_users(self, activity):
+        try:
+            cursor = self._cursor()
+            user_ids = sorted(activity)
+            self._execute(cursor, """
+                UPDATE users u
+                SET last_active = GREATEST(u.last_active, a.seen)
+                FROM unnest(%s::BIGINT[], %s::TIMESTAMP[]) AS a(user_id, seen)
+                WHERE u.user_id = a.user_id
+            """, (user_ids, [activity[user_id] for user_id in user_ids]))
+            self._commit()
+            cursor.close()
+            return True
         except Error as e:
-            print(f"Error updating statistics: {e}")
+            print(f"Error updating user activity: {e}")
             return False
     
+    def purge_inactive_users(self, inactive_days, batch_size=500):
+        try:
+            cursor = self._cursor()
+            self._execute(cursor, """
+                DELETE FROM users WHERE user_id IN (
+                    SELECT user_id FROM users
+                    WHERE last_active < CURRENT_TIMESTAMP - %s * INTERVAL '1 day'
+                    ORDER BY last_active
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING user_id
+            """, (inactive_days, batch_size))
+            user_ids = [row[0] for row in cursor.fetchall()]
+            if user_ids:
+                self._execute(cursor, "DELETE FROM quiz_events WHERE user_id = ANY(%s)", (user_ids,))
+            self._commit()
+            cursor.close()
+            return len(user_ids)
+        except Error as e:
+            print(f"Error purging inactive users: {e}")
+            return 0
+    
+    def create_broadcast(self, message_text):
+        try:
+            cursor = self._cursor()
+            self._execute(cursor, """
+                INSERT INTO broadcasts (message_text, total_users)
+                SELECT %s, COUNT(*) FROM users
+                RETURNING id
+            """, (message_text,))
+            broadcast_id = cursor.fetchone()[0]
+            self._commit()
+            cursor.close()
+            return broadcast_id
+        except Error as e:
+            print(f"Error creating broadcast: {e}")
+            return None
+    
+    @retry_read
+    def get_broadcast(self, broadcast_id):
+        try:
+            cursor = self._cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            self._execute(cursor, """
+                SELECT id, message_text, status, total_users, last_user_id, sent_count, failed_count
+                FROM broadcasts WHERE id = %s
+            """, (broadcast_id,))
+            broadcast = cursor.fetchone()
+            cursor.close()
+            return dict(broadcast) if broadcast else None
+        except Error as e:
+            print(f"Error getting broadcast: {e}")
+            return None
+    
+    @retry_read
+    def get_active_broadcast(self):
+        try:
+            cursor = self._cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            self._execute(cursor, """
+                SELECT id, message_text, status, total_users, last_user_id, sent_count, failed_count
+                FROM broadcasts WHERE status IN ('pending', 'running')
+                ORDER BY id
+                LIMIT 1
+            """)
+            broadcast = cursor.fetchone()
+            cursor.close()
+            return dict(broadcast) if broadcast else None
+        except Error as e:
+            print(f"Error getting active broadcast: {e}")
+            return None
+    
+    def update_broadcast(self, broadcast_id, status, last_user_id, sent_count, failed_count):
+        try:
+            cursor = self._cursor()
+            self._execute(cursor, """
+                UPDATE broadcasts
+                SET status = %s, last_user_id = %s, sent_count = %s, failed_count = %s,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND status <> 'cancelled'
+            """, (status, last_user_id, sent_count, failed_count, broadcast_id))
+            updated = cursor.rowcount > 0
+            self._commit()
+            cursor.close()
+            return updated
+        except Error as e:
+            print(f"Error updating broadcast: {e}")
+            return False
+    
+    def cancel_broadcast(self, broadcast_id):
+        try:
+            cursor = self._cursor()
+            self._execute(cursor, """
+                UPDATE broadcasts SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND status IN ('pending', 'running')
+            """, (broadcast_id,))
+            self._commit()
+            cursor.close()
+            return True
+        except Error as e:
+            print(f"Error cancelling broadcast: {e}")
+            return False
+    
+    def iter_user_id_batches(self, after_user_id, batch_size=100, chunk_size=1000):
+        connection = self.open_connection()
+        try:
+            while True:
+                cursor = connection.cursor(name='broadcast_user_ids')
+                cursor.itersize = batch_size
+                self._execute(cursor, """
+                    SELECT user_id FROM users
+                    WHERE user_id > %s
+                    ORDER BY user_id
+                    LIMIT %s
+                """, (after_user_id, chunk_size))
+                
+                rows_in_chunk = 0
+                while True:
+                    batch = [row[0] for row in cursor.fetchmany(batch_size)]
+                    if not batch:
+                        break
+                    rows_in_chunk += len(batch)
+                    after_user_id = batch[-1]
+                    yield batch
+                
+                cursor.close()
+                connection.commit()
+                
+                if rows_in_chunk < chunk_size:
+                    return
+        finally:
+            connection.close()
+    
     def close(self):
+        for replica in self.replicas:
+            replica.close()
+        if self.pool:
+            self.pool.closeall()
+            self.pool = None
         if self.connection:
             self.connection.close()
             print("Database connection closed") 
\ No newline at end of file
@@ -7,9 +7,15 @@ CREATE TABLE users (
     username VARCHAR(255),
     first_name VARCHAR(255),
     last_name VARCHAR(255),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Lookup key for vocabulary: NFKC-normalized, single-spaced, trimmed and lower-cased (same rule as vocab_index.normalize)
+CREATE FUNCTION word_key(word TEXT) RETURNS TEXT AS $$
+    SELECT lower(btrim(regexp_replace(normalize(word, NFKC), '\s+', ' ', 'g')))
+$$ LANGUAGE SQL IMMUTABLE STRICT PARALLEL SAFE;
+
 CREATE TABLE common_words (
     id SERIAL PRIMARY KEY,
     english_word VARCHAR(255) UNIQUE NOT NULL,
@@ -23,27 +29,93 @@ CREATE TABLE user_words (
     user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
     english_word VARCHAR(255) NOT NULL,
     translation_word VARCHAR(255) NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    UNIQUE(user_id, english_word)
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
-CREATE TABLE learning_stats (
-    id SERIAL PRIMARY KEY,
+CREATE TABLE user_categories (
     user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
+    category VARCHAR(100) NOT NULL,
+    PRIMARY KEY (user_id, category)
+);
+
+CREATE TABLE learning_stats (
+    id SERIAL,
+    user_id BIGINT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
     word_id BIGINT,
     word_type VARCHAR(50),
     correct_answers INTEGER DEFAULT 0,
     wrong_answers INTEGER DEFAULT 0,
     last_practiced TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, id),
+    UNIQUE (user_id, word_id, word_type)
+) PARTITION BY HASH (user_id);
+
+CREATE TABLE learning_stats_p0 PARTITION OF learning_stats FOR VALUES WITH (MODULUS 8, REMAINDER 0);
+CREATE TABLE learning_stats_p1 PARTITION OF learning_stats FOR VALUES WITH (MODULUS 8, REMAINDER 1);
+CREATE TABLE learning_stats_p2 PARTITION OF learning_stats FOR VALUES WITH (MODULUS 8, REMAINDER 2);
+CREATE TABLE learning_stats_p3 PARTITION OF learning_stats FOR VALUES WITH (MODULUS 8, REMAINDER 3);
+CREATE TABLE learning_stats_p4 PARTITION OF learning_stats FOR VALUES WITH (MODULUS 8, REMAINDER 4);
+CREATE TABLE learning_stats_p5 PARTITION OF learning_stats FOR VALUES WITH (MODULUS 8, REMAINDER 5);
+CREATE TABLE learning_stats_p6 PARTITION OF learning_stats FOR VALUES WITH (MODULUS 8, REMAINDER 6);
+CREATE TABLE learning_stats_p7 PARTITION OF learning_stats FOR VALUES WITH (MODULUS 8, REMAINDER 7);
+
+-- Monthly partitions are created ahead of time by the bot's retention job
+CREATE TABLE quiz_events (
+    id BIGSERIAL,
+    user_id BIGINT NOT NULL,
+    word_id BIGINT NOT NULL,
+    word_type VARCHAR(50) NOT NULL,
+    chosen_option VARCHAR(255),
+    is_correct BOOLEAN NOT NULL,
+    latency_ms INTEGER,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE INDEX idx_quiz_events_user ON quiz_events (user_id);
+
+-- Partition for the current month; the bot keeps EVENT_PARTITIONS_AHEAD more months created from here on
+DO $$
+DECLARE
+    month DATE := date_trunc('month', CURRENT_DATE);
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE quiz_events_%s PARTITION OF quiz_events FOR VALUES FROM (%L) TO (%L)',
+        to_char(month, 'YYYYMM'), month, month + INTERVAL '1 month'
+    );
+END $$;
+
+CREATE TABLE quiz_event_compaction (
+    id INTEGER PRIMARY KEY,
+    last_event_id BIGINT DEFAULT 0,
+    compacted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO quiz_event_compaction (id, last_event_id) VALUES (1, 0);
+
+CREATE TABLE broadcasts (
+    id SERIAL PRIMARY KEY,
+    message_text TEXT NOT NULL,
+    status VARCHAR(20) DEFAULT 'pending',
+    total_users INTEGER DEFAULT 0,
+    last_user_id BIGINT DEFAULT 0,
+    sent_count INTEGER DEFAULT 0,
+    failed_count INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
 CREATE INDEX idx_users_user_id ON users(user_id);
 CREATE INDEX idx_common_words_english ON common_words(english_word);
+CREATE INDEX idx_common_words_category ON common_words(category);
 CREATE INDEX idx_user_words_user_id ON user_words(user_id);
 CREATE INDEX idx_user_words_english ON user_words(english_word);
+CREATE UNIQUE INDEX idx_common_words_key ON common_words(word_key(english_word));
+CREATE UNIQUE INDEX idx_user_words_key ON user_words(user_id, word_key(english_word));
 CREATE INDEX idx_learning_stats_user_id ON learning_stats(user_id);
 CREATE INDEX idx_learning_stats_word_id ON learning_stats(word_id);
+CREATE INDEX idx_users_last_active ON users(last_active);
 
 INSERT INTO common_words (english_word, translation_word, category) VALUES
 ('Peace', 'Мир', 'Basic'),
@@ -0,0 +1,245 @@
+import os
+import time
+import threading
+from collections import deque
+
+PRIORITY_HIGH = 'high'
+PRIORITY_LOW = 'low'
+
+UPDATE_FIELDS = [
+    'message', 'edited_message', 'callback_query', 'inline_query', 'chosen_inline_result',
+    'shipping_query', 'pre_checkout_query', 'poll_answer', 'my_chat_member', 'chat_member',
+    'chat_join_request', 'channel_post', 'edited_channel_post'
+]
+
+class WorkerQueue:
+    def __init__(self):
+        self.high = deque()
+        self.low = deque()
+        self.low_senders = {}
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def put(self, item, sender_id, priority):
+        with self.condition:
+            if priority == PRIORITY_LOW or self.low_senders.get(sender_id):
+                self.low.append((item, sender_id))
+                if sender_id is not None:
+                    self.low_senders[sender_id] = self.low_senders.get(sender_id, 0) + 1
+            else:
+                self.high.append(item)
+            self.condition.notify()
+
+    def get(self):
+        with self.condition:
+            while not self.high and not self.low and not self.closed:
+                self.condition.wait()
+            if self.high:
+                return self.high.popleft()
+            if self.low:
+                item, sender_id = self.low.popleft()
+                if sender_id is not None:
+                    remaining = self.low_senders[sender_id] - 1
+                    if remaining:
+                        self.low_senders[sender_id] = remaining
+                    else:
+                        del self.low_senders[sender_id]
+                return item
+            return None
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def qsize(self):
+        with self.condition:
+            return len(self.high) + len(self.low)
+
+class UpdateDispatcher:
+    def __init__(self, bot, workers=None, tracer=None, max_in_flight=None, max_queue_age=None, low_priority_share=None):
+        self.bot = bot
+        self.tracer = tracer
+        self.workers = int(workers or os.getenv('DISPATCH_WORKERS', '8'))
+        self.max_in_flight = int(max_in_flight or os.getenv('DISPATCH_MAX_IN_FLIGHT', '1000'))
+        self.max_queue_age = float(max_queue_age or os.getenv('DISPATCH_MAX_QUEUE_AGE', '30'))
+        self.low_priority_share = float(low_priority_share or os.getenv('DISPATCH_LOW_PRIORITY_SHARE', '0.5'))
+        self._process = bot.process_new_updates
+        self._queues = [WorkerQueue() for _ in range(self.workers)]
+        self._threads = []
+        self._lock = threading.Lock()
+        self._capacity = threading.Condition(self._lock)
+        self._classify = None
+        self._on_shed = None
+        self._saturated = None
+        self.in_flight = 0
+        self.processed = 0
+        self.failed = 0
+        self.shed = {}
+
+    def install(self):
+        self.bot.process_new_updates = self.dispatch
+
+    def set_admission(self, classify, on_shed, saturated=None):
+        self._classify = classify
+        self._on_shed = on_shed
+        self._saturated = saturated
+
+    def start(self):
+        if self._threads:
+            return
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, args=(index,), name=f"dispatch-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=10):
+        for updates in self._queues:
+            updates.close()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def dispatch(self, updates):
+        for update in updates:
+            if update.update_id > self.bot.last_update_id:
+                self.bot.last_update_id = update.update_id
+            self.admit(update)
+
+    def priority(self, update):
+        if self._classify is None:
+            return PRIORITY_HIGH
+        try:
+            return self._classify(update)
+        except Exception as e:
+            print(f"Error classifying update {update.update_id}: {e}")
+            return PRIORITY_HIGH
+
+    def admit(self, update):
+        priority = self.priority(update)
+        field, sender_id = self.sender(update)
+
+        with self._capacity:
+            if priority == PRIORITY_LOW:
+                if self.in_flight >= self.max_in_flight * self.low_priority_share:
+                    reason = 'budget'
+                elif self._saturated is not None and self._saturated():
+                    reason = 'saturated'
+                else:
+                    reason = None
+                if reason:
+                    self._count_shed(reason)
+                else:
+                    self.in_flight += 1
+            else:
+                reason = None
+                while self.in_flight >= self.max_in_flight:
+                    self._capacity.wait(1)
+                self.in_flight += 1
+
+        if reason:
+            self._shed(update, reason)
+            return False
+
+        self._queues[self.shard(update)].put((update, time.perf_counter(), priority), sender_id, priority)
+        return True
+
+    def sender(self, update):
+        for field in UPDATE_FIELDS:
+            content = getattr(update, field, None)
+            if content is None:
+                continue
+            user = getattr(content, 'from_user', None) or getattr(content, 'user', None)
+            if user is not None:
+                return field, user.id
+            chat = getattr(content, 'chat', None)
+            if chat is not None:
+                return field, chat.id
+            return field, None
+        return None, None
+
+    def shard(self, update):
+        field, sender_id = self.sender(update)
+        if sender_id is None:
+            return update.update_id % self.workers
+        return sender_id % self.workers
+
+    def depths(self):
+        return [updates.qsize() for updates in self._queues]
+
+    def stats(self):
+        depths = self.depths()
+        with self._lock:
+            processed, failed, in_flight = self.processed, self.failed, self.in_flight
+            shed = dict(self.shed)
+        return {
+            'queue_depths': depths,
+            'queue_depth': sum(depths),
+            'max_queue_depth': max(depths) if depths else 0,
+            'in_flight': in_flight,
+            'processed': processed,
+            'failed': failed,
+            'shed': shed,
+            'shed_total': sum(shed.values())
+        }
+
+    def _count_shed(self, reason):
+        self.shed[reason] = self.shed.get(reason, 0) + 1
+
+    def _shed(self, update, reason):
+        if self._on_shed is None:
+            return
+        try:
+            self._on_shed(update, reason)
+        except Exception as e:
+            print(f"Error shedding update {update.update_id}: {e}")
+
+    def _release(self):
+        with self._capacity:
+            self.in_flight -= 1
+            self._capacity.notify()
+
+    def _run(self, index):
+        updates = self._queues[index]
+        while True:
+            item = updates.get()
+            if item is None:
+                break
+            update, queued_at, priority = item
+
+            max_age = self.max_queue_age
+            if priority == PRIORITY_LOW:
+                max_age *= self.low_priority_share
+            if time.perf_counter() - queued_at > max_age:
+                with self._lock:
+                    self._count_shed('age')
+                self._shed(update, 'age')
+                self._release()
+                continue
+
+            trace = None
+            if self.tracer:
+                field, sender_id = self.sender(update)
+                trace = self.tracer.start_trace(
+                    'update', origin=queued_at,
+                    update_id=update.update_id, update_type=field, user_id=sender_id, worker=index, priority=priority
+                )
+
+            error = None
+            started = time.perf_counter()
+            try:
+                self._process([update])
+                with self._lock:
+                    self.processed += 1
+            except Exception as e:
+                error = str(e)
+                with self._lock:
+                    self.failed += 1
+                print(f"Error processing update {update.update_id}: {e}")
+            finally:
+                if trace:
+                    trace.add_span('queue_wait', queued_at, started - queued_at)
+                    trace.add_span('handler', started, time.perf_counter() - started)
+                if self.tracer:
+                    self.tracer.finish_trace(trace, error)
+                self._release()
@@ -0,0 +1,142 @@
+import os
+import time
+import threading
+from collections import deque
+from datetime import datetime
+
+class QuizEventLog:
+    def __init__(self, db, batch_size=None, flush_interval=None, compact_interval=None, max_buffer=None):
+        self.db = db
+        self.batch_size = int(batch_size or os.getenv('EVENT_BATCH_SIZE', '500'))
+        self.flush_interval = float(flush_interval or os.getenv('EVENT_FLUSH_INTERVAL', '1'))
+        self.compact_interval = float(compact_interval or os.getenv('EVENT_COMPACT_INTERVAL', '60'))
+        self.max_buffer = int(max_buffer or os.getenv('EVENT_MAX_BUFFER', '100000'))
+        self.compact_batch_size = int(os.getenv('EVENT_COMPACT_BATCH_SIZE', '10000'))
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._buffer = deque(maxlen=self.max_buffer)
+        self._activity = {}
+        self._thread = None
+        self._last_compaction = time.monotonic()
+
+        self.written = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    def record(self, user_id, word_id, word_type, chosen_option, is_correct, latency_ms=None):
+        event = (user_id, word_id, word_type, chosen_option, is_correct, latency_ms, datetime.now())
+        with self._lock:
+            if len(self._buffer) == self.max_buffer:
+                self.dropped += 1
+            self._buffer.append(event)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def record_many(self, events):
+        events = [
+            (user_id, word_id, word_type, chosen_option, is_correct, latency_ms, datetime.fromtimestamp(answered_at))
+            for user_id, word_id, word_type, chosen_option, is_correct, latency_ms, answered_at in events
+        ]
+        with self._lock:
+            overflow = len(self._buffer) + len(events) - self.max_buffer
+            if overflow > 0:
+                self.dropped += min(overflow, self.max_buffer)
+            self._buffer.extend(events)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def touch(self, user_id):
+        with self._lock:
+            self._activity[user_id] = datetime.now()
+
+    def pending(self):
+        with self._lock:
+            return len(self._buffer)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="quiz-event-log", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            events = list(self._buffer)
+            self._buffer.clear()
+            activity, self._activity = self._activity, {}
+
+        if activity:
+            with self.db.session():
+                touched = self.db.touch_users(activity)
+            if not touched:
+                with self._lock:
+                    for user_id, seen in activity.items():
+                        self._activity[user_id] = max(seen, self._activity.get(user_id, seen))
+
+        if not events:
+            return 0
+
+        for start in range(0, len(events), self.batch_size):
+            batch = events[start:start + self.batch_size]
+            with self.db.session():
+                written = self.db.copy_quiz_events(batch)
+            if written:
+                self.written += len(batch)
+                continue
+            done = self._write_rows(batch) if written is None else 0
+            if done < len(batch):
+                with self._lock:
+                    self._buffer.extendleft(reversed(events[start + done:]))
+                return start + done
+
+        return len(events)
+
+    def _write_rows(self, batch):
+        for index, event in enumerate(batch):
+            with self.db.session():
+                written = self.db.copy_quiz_events([event])
+            if written is False:
+                return index
+            if written is None:
+                self.rejected += 1
+                print(f"Dropped quiz event that cannot be stored: {event}")
+            else:
+                self.written += 1
+        return len(batch)
+
+    def compact(self):
+        total = 0
+        while True:
+            with self.db.session():
+                compacted = self.db.compact_learning_stats(self.compact_batch_size)
+            total += compacted
+            if compacted < self.compact_batch_size or self._stop.is_set():
+                break
+        if total:
+            print(f"Compacted {total} quiz events into learning_stats")
+        return total
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+
+            try:
+                self.flush()
+                if time.monotonic() - self._last_compaction >= self.compact_interval:
+                    self._last_compaction = time.monotonic()
+                    self.compact()
+            except Exception as e:
+                print(f"Quiz event log error: {e}")
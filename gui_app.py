@@ -1,28 +1,76 @@
 import customtkinter as ctk
 import threading
+import queue
 import os
 import sys
+import json
+import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from database import DatabaseManager
 import subprocess
+import signal
+import time
 
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("blue")
 
+MAX_LOG_LINES = 2000
+LOG_QUEUE_SIZE = 10000
+LOG_DRAIN_BATCH = 500
+LOG_POLL_MS = 100
+TASK_POLL_MS = 50
+METRICS_POLL_MS = 1000
+SPARKLINE_POINTS = 60
+BOT_STOP_TIMEOUT = 30
+BOT_STOP_POLL_MS = 200
+DASHBOARD_METRICS = [
+    ('updates_per_sec', "Updates/s"),
+    ('handler_p50', "Handler p50, ms"),
+    ('handler_p95', "Handler p95, ms"),
+    ('handler_p99', "Handler p99, ms"),
+    ('db_p50', "DB p50, ms"),
+    ('db_p95', "DB p95, ms"),
+    ('active_sessions', "Active sessions"),
+    ('send_queue_depth', "Send queue"),
+    ('dispatch_depth', "Update queue"),
+    ('dispatch_max_depth', "Busiest user queue"),
+    ('dispatch_shed', "Shed updates"),
+]
+
 class EnglishLearningBotGUI:
     def __init__(self):
         self.root = ctk.CTk()
         self.root.title("English Learning Bot - Management")
-        self.root.geometry("800x600")
+        self.root.geometry("900x900")
         self.root.resizable(True, True)
         
         self.db = None
         self.bot_process = None
         self.bot_running = False
+        self.bot_stopping = False
+        self.broadcast_id = None
+        self.log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        self.dropped_log_lines = 0
+        self.log_lock = threading.Lock()
+        self.db_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="gui-db")
+        self.task_results = queue.Queue()
+        self.db_task = None
+        self.db_task_description = None
+        self.db_task_target = None
+        self.metrics_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gui-metrics")
+        self.metrics_pending = False
+        self.last_metrics = None
+        self.dashboard_series = {key: deque(maxlen=SPARKLINE_POINTS) for key, _ in DASHBOARD_METRICS}
+        self.dashboard_tiles = {}
         
         load_dotenv()
         
         self.setup_ui()
+        self.root.after(LOG_POLL_MS, self.drain_log_queue)
+        self.root.after(TASK_POLL_MS, self.process_task_results)
+        self.root.after(METRICS_POLL_MS, self.poll_metrics)
         self.check_database_connection()
     
     def setup_ui(self):
@@ -36,6 +84,8 @@ class EnglishLearningBotGUI:
         self.create_database_frame()
         self.create_bot_control_frame()
         self.create_status_frame()
+        self.create_dashboard_frame()
+        self.create_broadcast_frame()
         self.create_log_frame()
     
     def create_database_frame(self):
@@ -106,6 +156,20 @@ class EnglishLearningBotGUI:
             command=self.initialize_database
         )
         self.init_db_btn.pack(side="left", padx=10)
+        
+        self.cancel_db_btn = ctk.CTkButton(
+            db_buttons_frame, 
+            text="Cancel", 
+            command=self.cancel_db_task,
+            fg_color="red",
+            state="disabled"
+        )
+        self.cancel_db_btn.pack(side="left", padx=10)
+        
+        self.db_task_label = ctk.CTkLabel(db_buttons_frame, text="")
+        self.db_task_label.pack(side="right", padx=10)
+        
+        self.db_progress = ctk.CTkProgressBar(db_frame, mode="indeterminate")
     
     def create_bot_control_frame(self):
         bot_frame = ctk.CTkFrame(self.root)
@@ -173,6 +237,238 @@ class EnglishLearningBotGUI:
         self.words_count_label = ctk.CTkLabel(stats_frame, text="0")
         self.words_count_label.pack(side="right", padx=10)
     
+    def create_dashboard_frame(self):
+        dashboard_frame = ctk.CTkFrame(self.root)
+        dashboard_frame.pack(fill="x", padx=20, pady=10)
+        
+        dashboard_title = ctk.CTkLabel(dashboard_frame, text="Performance", font=ctk.CTkFont(size=16, weight="bold"))
+        dashboard_title.pack(pady=10)
+        
+        tiles_frame = ctk.CTkFrame(dashboard_frame)
+        tiles_frame.pack(fill="x", padx=20, pady=5)
+        
+        for index, (key, title) in enumerate(DASHBOARD_METRICS):
+            tile = ctk.CTkFrame(tiles_frame)
+            tile.grid(row=index // 4, column=index % 4, padx=5, pady=5, sticky="nsew")
+            tiles_frame.grid_columnconfigure(index % 4, weight=1)
+            
+            ctk.CTkLabel(tile, text=title, font=ctk.CTkFont(size=11)).pack(padx=5)
+            value_label = ctk.CTkLabel(tile, text="-", font=ctk.CTkFont(size=14, weight="bold"))
+            value_label.pack(padx=5)
+            
+            canvas = ctk.CTkCanvas(tile, width=150, height=30, bg="#2b2b2b", highlightthickness=0)
+            canvas.pack(padx=5, pady=(0, 5))
+            line = canvas.create_line(0, 29, 0, 29, fill="#3b8ed0", width=1)
+            
+            self.dashboard_tiles[key] = (value_label, canvas, line)
+        
+        tools_frame = ctk.CTkFrame(dashboard_frame, fg_color="transparent")
+        tools_frame.pack(pady=(0, 10))
+        
+        slow_queries_btn = ctk.CTkButton(
+            tools_frame,
+            text="Slow Queries",
+            command=self.show_slow_queries,
+            width=140
+        )
+        slow_queries_btn.pack(side="left", padx=5)
+        
+        self.profile_btn = ctk.CTkButton(
+            tools_frame,
+            text="Profile CPU",
+            command=self.toggle_profiling,
+            width=140
+        )
+        self.profile_btn.pack(side="left", padx=5)
+    
+    def poll_metrics(self):
+        self.root.after(METRICS_POLL_MS, self.poll_metrics)
+        
+        if not self.bot_running or self.metrics_pending:
+            return
+        
+        self.metrics_pending = True
+        self.submit_task(
+            self.fetch_metrics,
+            self.show_metrics,
+            self.on_metrics_error,
+            executor=self.metrics_executor
+        )
+    
+    def fetch_bot_json(self, path, timeout=2):
+        port = os.getenv('METRICS_PORT', '8765')
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=timeout) as response:
+            return json.loads(response.read().decode('utf-8'))
+    
+    def fetch_metrics(self):
+        return self.fetch_bot_json('/metrics', timeout=1)
+    
+    def show_slow_queries(self):
+        if not self.bot_running:
+            self.log_message("Start the bot to view slow queries")
+            return
+        
+        self.submit_task(
+            self.fetch_slow_queries,
+            self.open_slow_queries_window,
+            lambda error: self.log_message(f"Slow query fetch error: {error}"),
+            executor=self.metrics_executor
+        )
+    
+    def fetch_slow_queries(self):
+        return self.fetch_bot_json('/slow-queries')
+    
+    def open_slow_queries_window(self, entries):
+        window = ctk.CTkToplevel(self.root)
+        window.title(f"Slow Queries ({len(entries)})")
+        window.geometry("900x600")
+        
+        text = ctk.CTkTextbox(window, font=ctk.CTkFont(family="Courier", size=12), wrap="none")
+        text.pack(fill="both", expand=True, padx=10, pady=10)
+        
+        if not entries:
+            text.insert("end", "No slow queries recorded since the bot started.")
+        
+        for entry in entries:
+            text.insert("end", f"{entry['time']}  {entry['duration_ms']} ms\n")
+            text.insert("end", f"{entry['query']}\n")
+            if entry.get('params'):
+                text.insert("end", f"Params: {entry['params']}\n")
+            text.insert("end", f"\n{entry.get('plan') or '(no plan captured)'}\n")
+            text.insert("end", "\n" + "-" * 80 + "\n\n")
+        
+        text.configure(state="disabled")
+    
+    def toggle_profiling(self):
+        if not self.bot_running:
+            self.log_message("Start the bot to profile it")
+            return
+        
+        self.submit_task(
+            self.fetch_profile_toggle,
+            self.on_profile_status,
+            lambda error: self.log_message(f"Profiler error: {error}"),
+            executor=self.metrics_executor
+        )
+    
+    def fetch_profile_toggle(self):
+        status = self.fetch_bot_json('/profile')
+        return self.fetch_bot_json('/profile/stop' if status['running'] else '/profile/start', timeout=15)
+    
+    def check_profile_status(self):
+        if not self.bot_running:
+            self.profile_btn.configure(text="Profile CPU")
+            return
+        
+        self.submit_task(
+            lambda: self.fetch_bot_json('/profile'),
+            self.on_profile_status,
+            lambda error: self.log_message(f"Profiler error: {error}"),
+            executor=self.metrics_executor
+        )
+    
+    def on_profile_status(self, status):
+        if status['running']:
+            remaining = status['duration'] - (time.time() - status['started_at'])
+            self.profile_btn.configure(text="Stop Profiling")
+            self.log_message(f"Profiling bot threads, collapsed stacks will be written to {status['path']}")
+            self.root.after(int(max(remaining, 0) * 1000) + 1000, self.check_profile_status)
+        else:
+            self.profile_btn.configure(text="Profile CPU")
+            if status['last_path']:
+                self.log_message(f"Profile saved ({status['samples']} samples): {status['last_path']}")
+    
+    def on_metrics_error(self, error):
+        self.metrics_pending = False
+        self.last_metrics = None
+    
+    def show_metrics(self, snapshot):
+        self.metrics_pending = False
+        
+        updates = snapshot['counters'].get('updates', 0)
+        updates_per_sec = 0
+        if self.last_metrics:
+            elapsed = snapshot['timestamp'] - self.last_metrics['timestamp']
+            if elapsed > 0:
+                updates_per_sec = max(0, updates - self.last_metrics['counters'].get('updates', 0)) / elapsed
+        self.last_metrics = snapshot
+        
+        timings = snapshot['timings_ms']
+        gauges = snapshot['gauges']
+        values = {
+            'updates_per_sec': updates_per_sec,
+            'handler_p50': timings.get('handler', {}).get('p50', 0),
+            'handler_p95': timings.get('handler', {}).get('p95', 0),
+            'handler_p99': timings.get('handler', {}).get('p99', 0),
+            'db_p50': timings.get('db', {}).get('p50', 0),
+            'db_p95': timings.get('db', {}).get('p95', 0),
+            'active_sessions': gauges.get('active_sessions', 0),
+            'send_queue_depth': gauges.get('send_queue', {}).get('queue_depth', 0),
+            'dispatch_depth': gauges.get('dispatch', {}).get('queue_depth', 0),
+            'dispatch_max_depth': gauges.get('dispatch', {}).get('max_queue_depth', 0),
+            'dispatch_shed': gauges.get('dispatch', {}).get('shed_total', 0),
+        }
+        
+        for key, value in values.items():
+            series = self.dashboard_series[key]
+            series.append(value)
+            
+            value_label, canvas, line = self.dashboard_tiles[key]
+            value_label.configure(text=f"{value:.1f}" if isinstance(value, float) else str(value))
+            self.draw_sparkline(canvas, line, series)
+    
+    def draw_sparkline(self, canvas, line, series):
+        width = int(canvas.cget("width"))
+        height = int(canvas.cget("height"))
+        peak = max(series) or 1
+        step = width / (SPARKLINE_POINTS - 1)
+        offset = SPARKLINE_POINTS - len(series)
+        
+        points = []
+        for index, value in enumerate(series):
+            points.append((offset + index) * step)
+            points.append(height - 1 - (value / peak) * (height - 2))
+        
+        if len(points) < 4:
+            points = points + points
+        canvas.coords(line, *points)
+    
+    def create_broadcast_frame(self):
+        broadcast_frame = ctk.CTkFrame(self.root)
+        broadcast_frame.pack(fill="x", padx=20, pady=10)
+        
+        broadcast_title = ctk.CTkLabel(broadcast_frame, text="Broadcast", font=ctk.CTkFont(size=16, weight="bold"))
+        broadcast_title.pack(pady=10)
+        
+        self.broadcast_text = ctk.CTkTextbox(broadcast_frame, height=60)
+        self.broadcast_text.pack(fill="x", padx=20, pady=5)
+        
+        broadcast_buttons_frame = ctk.CTkFrame(broadcast_frame)
+        broadcast_buttons_frame.pack(fill="x", padx=20, pady=5)
+        
+        self.start_broadcast_btn = ctk.CTkButton(
+            broadcast_buttons_frame, 
+            text="Send to All Users", 
+            command=self.start_broadcast
+        )
+        self.start_broadcast_btn.pack(side="left", padx=10)
+        
+        self.cancel_broadcast_btn = ctk.CTkButton(
+            broadcast_buttons_frame, 
+            text="Cancel Broadcast", 
+            command=self.cancel_broadcast,
+            fg_color="red",
+            state="disabled"
+        )
+        self.cancel_broadcast_btn.pack(side="left", padx=10)
+        
+        self.broadcast_status_label = ctk.CTkLabel(broadcast_buttons_frame, text="No broadcast")
+        self.broadcast_status_label.pack(side="right", padx=10)
+        
+        self.broadcast_progress = ctk.CTkProgressBar(broadcast_frame)
+        self.broadcast_progress.pack(fill="x", padx=20, pady=10)
+        self.broadcast_progress.set(0)
+    
     def create_log_frame(self):
         log_frame = ctk.CTkFrame(self.root)
         log_frame.pack(fill="both", expand=True, padx=20, pady=10)
@@ -203,100 +499,344 @@ class EnglishLearningBotGUI:
     def log_message(self, message):
         from datetime import datetime
         timestamp = datetime.now().strftime("%H:%M:%S")
-        self.log_text.insert("end", f"[{timestamp}] {message}\n")
-        self.log_text.see("end")
+        line = f"[{timestamp}] {message}\n"
+        
+        with self.log_lock:
+            try:
+                self.log_queue.put_nowait(line)
+            except queue.Full:
+                try:
+                    self.log_queue.get_nowait()
+                except queue.Empty:
+                    pass
+                self.log_queue.put_nowait(line)
+                self.dropped_log_lines += 1
     
-    def check_database_connection(self):
+    def drain_log_queue(self):
+        lines = []
         try:
-            self.db = DatabaseManager()
-            self.db_status_label.configure(text="Connected", text_color="green")
-            self.log_message("Database connection established")
+            while len(lines) < LOG_DRAIN_BATCH:
+                lines.append(self.log_queue.get_nowait())
+        except queue.Empty:
+            pass
+        
+        with self.log_lock:
+            dropped = self.dropped_log_lines
+            self.dropped_log_lines = 0
+        if dropped:
+            lines.append(f"... {dropped} log lines dropped ...\n")
+        
+        if lines:
+            self.log_text.insert("end", "".join(lines))
             
-            self.update_words_count()
+            line_count = int(self.log_text.index("end-1c").split(".")[0])
+            if line_count > MAX_LOG_LINES:
+                self.log_text.delete("1.0", f"{line_count - MAX_LOG_LINES + 1}.0")
             
-        except Exception as e:
-            self.db_status_label.configure(text="Connection Error", text_color="red")
-            self.log_message(f"Database connection error: {e}")
+            self.log_text.see("end")
+        
+        delay = 10 if not self.log_queue.empty() else LOG_POLL_MS
+        self.root.after(delay, self.drain_log_queue)
     
-    def connect_database(self):
+    def read_bot_stream(self, stream, prefix):
         try:
-            os.environ['DB_HOST'] = self.host_entry.get()
-            os.environ['DB_NAME'] = self.db_name_entry.get()
-            os.environ['DB_USER'] = self.user_entry.get()
-            os.environ['DB_PASSWORD'] = self.password_entry.get()
-            os.environ['DB_PORT'] = self.port_entry.get()
+            for line in iter(stream.readline, ''):
+                line = line.rstrip()
+                if line:
+                    self.log_message(f"{prefix}: {line}")
+        except Exception as e:
+            self.log_message(f"{prefix} stream error: {e}")
+        finally:
+            stream.close()
+    
+    def process_task_results(self):
+        while True:
+            try:
+                future, on_success, on_error = self.task_results.get_nowait()
+            except queue.Empty:
+                break
             
-            if self.db:
-                self.db.close()
+            if future.cancelled():
+                continue
             
-            self.db = DatabaseManager()
+            try:
+                error = future.exception()
+                if error:
+                    if on_error:
+                        on_error(error)
+                    else:
+                        self.log_message(f"Database error: {error}")
+                elif on_success:
+                    on_success(future.result())
+            except Exception as e:
+                self.log_message(f"Error handling database result: {e}")
+        
+        self.root.after(TASK_POLL_MS, self.process_task_results)
+    
+    def submit_task(self, work, on_success=None, on_error=None, executor=None):
+        future = (executor or self.db_executor).submit(work)
+        future.add_done_callback(lambda done: self.task_results.put((done, on_success, on_error)))
+        return future
+    
+    def run_db_task(self, description, work, on_success=None, on_error=None, db=None):
+        if self.db_task:
+            self.log_message(f"Wait for the current operation to finish: {self.db_task_description}")
+            return False
+        
+        target = {'db': db, 'thread': None}
+        
+        def run():
+            target['thread'] = threading.get_ident()
+            return work()
+        
+        def finish(callback, result):
+            if future is not self.db_task:
+                self.discard_db_result(result)
+                return
+            self.set_db_busy(None)
+            if callback:
+                callback(result)
+        
+        def finish_error(error):
+            if future is not self.db_task:
+                return
+            self.set_db_busy(None)
+            if on_error:
+                on_error(error)
+            else:
+                self.log_message(f"{description} error: {error}")
+        
+        future = self.submit_task(run, lambda result: finish(on_success, result), finish_error)
+        self.db_task = future
+        self.db_task_target = target
+        self.set_db_busy(description)
+        return True
+    
+    def cancel_db_task(self):
+        future = self.db_task
+        if not future:
+            return
+        target = self.db_task_target
+        
+        self.log_message(f"{self.db_task_description} cancelled")
+        self.set_db_busy(None)
+        
+        if self.db:
             self.db_status_label.configure(text="Connected", text_color="green")
-            self.log_message("Database reconnection successful")
-            
-            self.update_words_count()
-            
-        except Exception as e:
-            self.db_status_label.configure(text="Connection Error", text_color="red")
-            self.log_message(f"Database reconnection error: {e}")
+        else:
+            self.db_status_label.configure(text="Not Connected", text_color="red")
+        
+        if not future.cancel() and target['db'] and target['thread']:
+            try:
+                target['db'].cancel_queries(target['thread'])
+            except Exception as e:
+                self.log_message(f"Query cancel error: {e}")
+    
+    def discard_db_result(self, result):
+        if isinstance(result, DatabaseManager) and result is not self.db:
+            result.close()
+    
+    def set_db_busy(self, description):
+        self.db_task_description = description
+        state = "disabled" if description else "normal"
+        
+        self.connect_db_btn.configure(state=state)
+        self.test_db_btn.configure(state=state)
+        self.init_db_btn.configure(state=state)
+        
+        if description:
+            self.db_task_label.configure(text=f"{description}...")
+            self.cancel_db_btn.configure(state="normal")
+            self.db_progress.pack(fill="x", padx=20, pady=(0, 10))
+            self.db_progress.start()
+        else:
+            self.db_task = None
+            self.db_task_label.configure(text="")
+            self.cancel_db_btn.configure(state="disabled")
+            self.db_progress.stop()
+            self.db_progress.pack_forget()
+    
+    def on_database_connected(self, db):
+        if self.db and self.db is not db:
+            old_db = self.db
+            self.submit_task(old_db.close)
+        
+        self.db = db
+        self.db_status_label.configure(text="Connected", text_color="green")
+        self.log_message("Database connection established")
+        
+        self.update_words_count()
+        self.resume_broadcast_progress()
+    
+    def on_database_connection_error(self, error):
+        self.db_status_label.configure(text="Connection Error", text_color="red")
+        self.log_message(f"Database connection error: {error}")
+    
+    def check_database_connection(self):
+        started = self.run_db_task(
+            "Connecting to database",
+            DatabaseManager,
+            self.on_database_connected,
+            self.on_database_connection_error
+        )
+        if started:
+            self.db_status_label.configure(text="Connecting...", text_color="orange")
+    
+    def connect_database(self):
+        os.environ['DB_HOST'] = self.host_entry.get()
+        os.environ['DB_NAME'] = self.db_name_entry.get()
+        os.environ['DB_USER'] = self.user_entry.get()
+        os.environ['DB_PASSWORD'] = self.password_entry.get()
+        os.environ['DB_PORT'] = self.port_entry.get()
+        
+        self.check_database_connection()
     
     def test_database_connection(self):
-        try:
-            if self.db and self.db.connection:
-                cursor = self.db.connection.cursor()
-                cursor.execute("SELECT version();")
-                version = cursor.fetchone()
-                cursor.close()
-                
-                self.log_message(f"Connection test successful. PostgreSQL version: {version[0]}")
-                
-                cursor = self.db.connection.cursor()
-                cursor.execute("""
-                    SELECT table_name FROM information_schema.tables 
-                    WHERE table_schema = 'public'
-                    ORDER BY table_name;
-                """)
-                tables = [row[0] for row in cursor.fetchall()]
-                cursor.close()
-                
-                self.log_message(f"Found tables: {', '.join(tables)}")
-                
-            else:
-                self.log_message("Database not connected")
-                
-        except Exception as e:
-            self.log_message(f"Database test error: {e}")
+        if not self.db:
+            self.log_message("Database not connected")
+            return
+        
+        db = self.db
+        
+        def work():
+            with db.session():
+                return db.get_server_info()
+        
+        def done(result):
+            if not result:
+                self.log_message("Connection test failed")
+                return
+            version, tables = result
+            self.log_message(f"Connection test successful. PostgreSQL version: {version}")
+            self.log_message(f"Found tables: {', '.join(tables)}")
+        
+        self.run_db_task("Testing connection", work, done, db=db)
     
     def initialize_database(self):
-        try:
-            if self.db:
-                self.db.create_tables()
-                self.db.initialize_words()
-                self.log_message("Database initialized successfully")
-                
-                self.update_words_count()
-            else:
-                self.log_message("Database not connected")
-                
-        except Exception as e:
-            self.log_message(f"Database initialization error: {e}")
+        if not self.db:
+            self.log_message("Database not connected")
+            return
+        
+        db = self.db
+        
+        def work():
+            db.create_tables()
+            db.initialize_words()
+        
+        def done(result):
+            self.log_message("Database initialized successfully")
+            self.update_words_count()
+        
+        self.run_db_task("Initializing database", work, done, db=db)
     
     def update_words_count(self):
-        try:
-            if self.db and self.db.connection:
-                cursor = self.db.connection.cursor()
-                cursor.execute("SELECT COUNT(*) FROM common_words")
-                common_count = cursor.fetchone()[0]
-                cursor.close()
-                
-                self.words_count_label.configure(text=str(common_count))
-                
-        except Exception as e:
-            self.log_message(f"Error updating word count: {e}")
+        if not self.db:
+            return
+        
+        db = self.db
+        
+        def work():
+            with db.session():
+                stats = db.get_database_stats()
+            return stats['common_words'] if stats else '-'
+        
+        self.submit_task(
+            work,
+            lambda count: self.words_count_label.configure(text=str(count)),
+            lambda error: self.log_message(f"Error updating word count: {error}")
+        )
+    
+    def start_broadcast(self):
+        if self.broadcast_id:
+            self.log_message("A broadcast is already in progress")
+            return
+        
+        text = self.broadcast_text.get("1.0", "end").strip()
+        if not text:
+            self.log_message("Enter broadcast message")
+            return
+        
+        if not self.db:
+            self.log_message("Database not connected")
+            return
+        
+        self.start_broadcast_btn.configure(state="disabled")
+        
+        def done(broadcast_id):
+            if not broadcast_id:
+                self.start_broadcast_btn.configure(state="normal")
+                self.log_message("Failed to create broadcast")
+                return
+            
+            self.broadcast_id = broadcast_id
+            self.cancel_broadcast_btn.configure(state="normal")
+            self.log_message(f"Broadcast {broadcast_id} queued, the running bot will deliver it")
+            
+            self.poll_broadcast_progress()
+        
+        self.submit_task(lambda: self.db.create_broadcast(text), done)
+    
+    def cancel_broadcast(self):
+        if self.broadcast_id and self.db:
+            broadcast_id = self.broadcast_id
+            self.submit_task(
+                lambda: self.db.cancel_broadcast(broadcast_id),
+                lambda result: self.log_message(f"Broadcast {broadcast_id} cancelled")
+            )
+    
+    def resume_broadcast_progress(self):
+        def done(broadcast):
+            if broadcast and not self.broadcast_id:
+                self.broadcast_id = broadcast['id']
+                self.start_broadcast_btn.configure(state="disabled")
+                self.cancel_broadcast_btn.configure(state="normal")
+                self.log_message(f"Broadcast {broadcast['id']} is in progress")
+                self.poll_broadcast_progress()
+        
+        self.submit_task(self.db.get_active_broadcast, done)
+    
+    def poll_broadcast_progress(self):
+        if not self.broadcast_id or not self.db:
+            return
+        
+        broadcast_id = self.broadcast_id
+        self.submit_task(
+            lambda: self.db.get_broadcast(broadcast_id),
+            self.show_broadcast_progress,
+            lambda error: self.root.after(1000, self.poll_broadcast_progress)
+        )
+    
+    def show_broadcast_progress(self, broadcast):
+        if not broadcast:
+            self.root.after(1000, self.poll_broadcast_progress)
+            return
+        
+        if broadcast['id'] != self.broadcast_id:
+            return
+        
+        processed = broadcast['sent_count'] + broadcast['failed_count']
+        total = broadcast['total_users']
+        self.broadcast_progress.set(min(1, processed / total) if total else 0)
+        self.broadcast_status_label.configure(
+            text=f"{broadcast['status']}: {broadcast['sent_count']} sent, {broadcast['failed_count']} failed of {total}"
+        )
+        
+        if broadcast['status'] in ('pending', 'running'):
+            self.root.after(1000, self.poll_broadcast_progress)
+            return
+        
+        self.log_message(f"Broadcast {self.broadcast_id} {broadcast['status']}")
+        self.broadcast_id = None
+        self.start_broadcast_btn.configure(state="normal")
+        self.cancel_broadcast_btn.configure(state="disabled")
     
     def start_bot(self):
         if self.bot_running:
             self.log_message("Bot is already running")
             return
+        if self.bot_stopping:
+            self.log_message("Bot is still stopping")
+            return
         
         token = self.token_entry.get().strip()
         if not token:
@@ -309,14 +849,24 @@ class EnglishLearningBotGUI:
             script_dir = os.path.dirname(os.path.abspath(__file__))
             bot_path = os.path.join(script_dir, "bot.py")
             
+            env = dict(os.environ, PYTHONUNBUFFERED='1', PYTHONIOENCODING='utf-8')
+            
             self.bot_process = subprocess.Popen(
                 [sys.executable, bot_path],
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 text=True,
-                cwd=script_dir
+                encoding='utf-8',
+                errors='replace',
+                bufsize=1,
+                cwd=script_dir,
+                env=env,
+                creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if os.name == 'nt' else 0
             )
             
+            threading.Thread(target=self.read_bot_stream, args=(self.bot_process.stdout, "Bot"), daemon=True).start()
+            threading.Thread(target=self.read_bot_stream, args=(self.bot_process.stderr, "Bot error"), daemon=True).start()
+            
             self.bot_running = True
             self.bot_status_label.configure(text="Running", text_color="green")
             self.start_bot_btn.configure(state="disabled")
@@ -324,55 +874,83 @@ class EnglishLearningBotGUI:
             
             self.log_message("Telegram bot started")
             
-            threading.Thread(target=self.monitor_bot_process, daemon=True).start()
+            self.root.after(1000, self.monitor_bot_process, self.bot_process)
             
         except Exception as e:
             self.log_message(f"Bot start error: {e}")
     
-    def stop_bot(self):
+    def request_bot_shutdown(self, process):
+        if os.name == 'nt':
+            process.send_signal(signal.CTRL_BREAK_EVENT)
+        else:
+            process.terminate()
+    
+    def stop_bot(self, on_stopped=None):
         if not self.bot_running:
             return
         
         try:
-            if self.bot_process:
-                self.bot_process.terminate()
-                self.bot_process.wait(timeout=5)
-            
+            process = self.bot_process
             self.bot_running = False
-            self.bot_status_label.configure(text="Stopped", text_color="orange")
-            self.start_bot_btn.configure(state="normal")
+            self.bot_stopping = True
+            self.bot_status_label.configure(text="Stopping...", text_color="orange")
+            self.start_bot_btn.configure(state="disabled")
             self.stop_bot_btn.configure(state="disabled")
             
-            self.log_message("Telegram bot stopped")
+            if process:
+                self.request_bot_shutdown(process)
+                self.log_message("Waiting for the bot to save its state and stop...")
+            self.root.after(BOT_STOP_POLL_MS, self.wait_for_bot_exit, process, time.monotonic() + BOT_STOP_TIMEOUT, on_stopped)
             
         except Exception as e:
+            self.bot_stopping = False
             self.log_message(f"Bot stop error: {e}")
     
+    def wait_for_bot_exit(self, process, deadline, on_stopped):
+        try:
+            if process and process.poll() is None:
+                if time.monotonic() < deadline:
+                    self.root.after(BOT_STOP_POLL_MS, self.wait_for_bot_exit, process, deadline, on_stopped)
+                    return
+                process.kill()
+                process.wait(timeout=5)
+                self.log_message(f"Bot did not stop within {BOT_STOP_TIMEOUT} seconds and was killed")
+        except Exception as e:
+            self.log_message(f"Bot stop error: {e}")
+        
+        self.bot_stopping = False
+        self.bot_status_label.configure(text="Stopped", text_color="orange")
+        self.start_bot_btn.configure(state="normal")
+        
+        self.log_message("Telegram bot stopped")
+        
+        if on_stopped:
+            on_stopped()
+    
     def restart_bot(self):
         self.log_message("Restarting bot...")
-        self.stop_bot()
-        threading.Timer(2.0, self.start_bot).start()
+        if self.bot_running:
+            self.stop_bot(on_stopped=self.start_bot)
+        elif not self.bot_stopping:
+            self.start_bot()
     
-    def monitor_bot_process(self):
+    def monitor_bot_process(self, process):
+        if not self.bot_running or process is not self.bot_process:
+            return
+        
         try:
-            while self.bot_running and self.bot_process:
-                if self.bot_process.poll() is not None:
-                    self.bot_running = False
-                    self.bot_status_label.configure(text="Terminated with Error", text_color="red")
-                    self.start_bot_btn.configure(state="normal")
-                    self.stop_bot_btn.configure(state="disabled")
-                    
-                    stdout, stderr = self.bot_process.communicate()
-                    if stdout:
-                        self.log_message(f"Bot output: {stdout.strip()}")
-                    if stderr:
-                        self.log_message(f"Bot errors: {stderr.strip()}")
-                    
-                    self.log_message("Bot process terminated unexpectedly")
-                    break
-                
-                threading.Event().wait(1)
-                
+            return_code = process.poll()
+            if return_code is None:
+                self.root.after(1000, self.monitor_bot_process, process)
+                return
+            
+            self.bot_running = False
+            self.bot_status_label.configure(text="Terminated with Error", text_color="red")
+            self.start_bot_btn.configure(state="normal")
+            self.stop_bot_btn.configure(state="disabled")
+            
+            self.log_message(f"Bot process terminated unexpectedly (exit code {return_code})")
+            
         except Exception as e:
             self.log_message(f"Process monitoring error: {e}")
     
@@ -397,8 +975,15 @@ class EnglishLearningBotGUI:
         self.log_message("GUI application started")
         self.root.mainloop()
         
-        if self.bot_running:
-            self.stop_bot()
+        if self.bot_process and self.bot_process.poll() is None:
+            try:
+                self.request_bot_shutdown(self.bot_process)
+                self.bot_process.wait(timeout=BOT_STOP_TIMEOUT)
+            except Exception:
+                self.bot_process.kill()
+        
+        self.db_executor.shutdown(wait=False, cancel_futures=True)
+        self.metrics_executor.shutdown(wait=False, cancel_futures=True)
         
         if self.db:
             self.db.close()
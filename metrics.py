@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from telebot.handler_backends import BaseMiddleware
+
+class RingBuffer:
+    def __init__(self, size):
+        self.size = size
+        self.values = [0.0] * size
+        self.count = 0
+        self.index = 0
+
+    def add(self, value):
+        self.values[self.index] = value
+        self.index = (self.index + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def snapshot(self):
+        if self.count < self.size:
+            return self.values[:self.count]
+        return self.values[self.index:] + self.values[:self.index]
+
+def percentiles(samples, points=(50, 95, 99)):
+    if not samples:
+        return {f"p{point}": 0 for point in points}
+    ordered = sorted(samples)
+    last = len(ordered) - 1
+    return {f"p{point}": ordered[min(last, int(round(last * point / 100)))] for point in points}
+
+class Metrics:
+    def __init__(self, sample_size=None):
+        self.sample_size = int(sample_size or os.getenv('METRICS_SAMPLE_SIZE', '1000'))
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timings = {}
+        self._gauges = {}
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name, seconds):
+        with self._lock:
+            buffer = self._timings.get(name)
+            if buffer is None:
+                buffer = self._timings[name] = RingBuffer(self.sample_size)
+            buffer.add(seconds * 1000)
+
+    def add_gauge(self, name, provider):
+        self._gauges[name] = provider
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self._counters)
+            timings = {name: buffer.snapshot() for name, buffer in self._timings.items()}
+
+        gauges = {}
+        for name, provider in self._gauges.items():
+            try:
+                gauges[name] = provider()
+            except Exception as e:
+                print(f"Metrics gauge '{name}' error: {e}")
+
+        return {
+            'timestamp': time.time(),
+            'uptime': time.time() - self.started_at,
+            'counters': counters,
+            'timings_ms': {name: percentiles(samples) for name, samples in timings.items()},
+            'gauges': gauges
+        }
+
+class MetricsMiddleware(BaseMiddleware):
+    def __init__(self, metrics):
+        super().__init__()
+        self.metrics = metrics
+        self.update_types = ['message', 'callback_query', 'inline_query']
+
+    def pre_process(self, message, data):
+        data['started_at'] = time.perf_counter()
+        self.metrics.increment('updates')
+
+    def post_process(self, message, data, exception):
+        started_at = data.get('started_at')
+        if started_at is not None:
+            self.metrics.observe('handler', time.perf_counter() - started_at)
+        if exception:
+            self.metrics.increment('handler_errors')
+
+class MetricsServer:
+    def __init__(self, metrics, host='127.0.0.1', port=None):
+        self.metrics = metrics
+        self.host = host
+        self.port = int(port or os.getenv('METRICS_PORT', '8765'))
+        self.routes = {'/metrics': metrics.snapshot}
+        self._server = None
+        self._thread = None
+
+    def add_route(self, path, provider):
+        self.routes[path] = provider
+
+    def start(self):
+        routes = self.routes
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                provider = routes.get(self.path.split('?', 1)[0])
+                if provider is None:
+                    self.send_error(404)
+                    return
+                body = json.dumps(provider(), ensure_ascii=False, default=str).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            print(f"Metrics server error: {e}")
+            return
+
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+        print(f"Metrics available at http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
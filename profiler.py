@@ -0,0 +1,119 @@
+import os
+import re
+import sys
+import time
+import signal
+import threading
+from datetime import datetime
+
+class SamplingProfiler:
+    def __init__(self, interval_ms=None, duration=None, directory=None, threads=None):
+        self.interval = float(interval_ms or os.getenv('PROFILE_INTERVAL_MS', '5')) / 1000
+        self.duration = float(duration or os.getenv('PROFILE_DURATION', '30'))
+        self.directory = directory or os.getenv('PROFILE_DIR', 'profiles')
+        threads = threads or os.getenv('PROFILE_THREADS', 'dispatch-,MainThread')
+        self.thread_prefixes = tuple(prefix.strip() for prefix in threads.split(',') if prefix.strip())
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._labels = {}
+        self.path = None
+        self.started_at = None
+        self.samples = 0
+        self.last_path = None
+
+    def start(self, duration=None):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return self.status()
+            os.makedirs(self.directory, exist_ok=True)
+            name = datetime.now().strftime('profile-%Y%m%d-%H%M%S-%f.folded')
+            self.path = os.path.abspath(os.path.join(self.directory, name))
+            self.started_at = time.time()
+            self.samples = 0
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, args=(self.path, duration or self.duration),
+                name="sampling-profiler", daemon=True
+            )
+            self._thread.start()
+        print(f"Profiling threads {', '.join(self.thread_prefixes)} for {duration or self.duration:.0f}s into {self.path}")
+        return self.status()
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        thread = self._thread
+        if thread:
+            thread.join(timeout)
+        return self.status()
+
+    def toggle(self):
+        if self._thread and self._thread.is_alive():
+            return self.stop()
+        return self.start()
+
+    def install_signal(self):
+        if not hasattr(signal, 'SIGUSR1'):
+            return False
+        signal.signal(signal.SIGUSR1, lambda signum, frame: threading.Thread(target=self.toggle, daemon=True).start())
+        return True
+
+    def status(self):
+        return {
+            'running': bool(self._thread and self._thread.is_alive()),
+            'path': self.path,
+            'started_at': self.started_at,
+            'samples': self.samples,
+            'interval_ms': self.interval * 1000,
+            'duration': self.duration,
+            'last_path': self.last_path
+        }
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def _thread_names(self):
+        names = {}
+        for thread in threading.enumerate():
+            if thread.name.startswith(self.thread_prefixes):
+                names[thread.ident] = re.sub(r'-\d+$', '', thread.name)
+        return names
+
+    def _run(self, path, duration):
+        own = threading.get_ident()
+        counts = {}
+        names = self._thread_names()
+        names_refreshed = time.monotonic()
+        deadline = names_refreshed + duration
+
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            if time.monotonic() - names_refreshed >= 1:
+                names = self._thread_names()
+                names_refreshed = time.monotonic()
+
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident)
+                if name is None or ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(name)
+                key = ';'.join(reversed(stack))
+                counts[key] = counts.get(key, 0) + 1
+            self.samples += 1
+
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                for stack, count in sorted(counts.items(), key=lambda item: item[1], reverse=True):
+                    f.write(f"{stack} {count}\n")
+            self.last_path = path
+            print(f"Profile written to {path} ({self.samples} samples, {len(counts)} unique stacks)")
+        except OSError as e:
+            print(f"Could not write profile {path}: {e}")
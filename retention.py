@@ -0,0 +1,63 @@
+import os
+import threading
+
+class RetentionJob:
+    def __init__(self, db, interval=None, event_retention_days=None, inactive_days=None, batch_size=None):
+        self.db = db
+        self.interval = float(interval or os.getenv('RETENTION_INTERVAL', '3600'))
+        self.event_retention_days = int(event_retention_days or os.getenv('EVENT_RETENTION_DAYS', '180'))
+        self.inactive_days = int(inactive_days or os.getenv('USER_INACTIVE_DAYS', '0'))
+        self.batch_size = int(batch_size or os.getenv('RETENTION_BATCH_SIZE', '500'))
+        self.batch_pause = float(os.getenv('RETENTION_BATCH_PAUSE', '0.2'))
+        self.archive = os.getenv('EVENT_ARCHIVE_PARTITIONS', '0') == '1'
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def run_once(self):
+        with self.db.session():
+            created = self.db.ensure_event_partitions()
+        if created:
+            print(f"Created {created} quiz event partitions")
+
+        if self.event_retention_days > 0:
+            with self.db.session():
+                expired = self.db.expired_event_partitions(self.event_retention_days)
+            for name in expired:
+                if self._stop.is_set():
+                    return
+                with self.db.session():
+                    removed = self.db.remove_event_partition(name, self.archive)
+                if removed:
+                    print(f"{'Detached' if self.archive else 'Dropped'} quiz event partition {name}")
+
+        if self.inactive_days > 0:
+            purged = 0
+            while not self._stop.is_set():
+                with self.db.session():
+                    deleted = self.db.purge_inactive_users(self.inactive_days, self.batch_size)
+                purged += deleted
+                if deleted < self.batch_size:
+                    break
+                self._stop.wait(self.batch_pause)
+            if purged:
+                print(f"Purged {purged} users inactive for more than {self.inactive_days} days")
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Retention error: {e}")
+            self._stop.wait(self.interval)
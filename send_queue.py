@@ -0,0 +1,306 @@
+import os
+import time
+import threading
+from collections import deque
+from telebot.apihelper import ApiTelegramException
+
+MAX_MESSAGE_LENGTH = 4096
+BUCKET_SWEEP_INTERVAL = 60
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def wait_time(self, now):
+        self.refill(now)
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now):
+        self.refill(now)
+        self.tokens -= 1
+
+    def block(self, now, seconds):
+        self.refill(now)
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+    def is_full(self, now):
+        self.refill(now)
+        return self.tokens >= self.capacity
+
+class SendQueue:
+    def __init__(self, bot, global_rate=None, chat_rate=None, chat_burst=None, workers=None, max_attempts=5, tracer=None):
+        self.bot = bot
+        self.tracer = tracer
+        self.global_rate = float(global_rate or os.getenv('SEND_GLOBAL_RATE', '25'))
+        self.chat_rate = float(chat_rate or os.getenv('SEND_CHAT_RATE', '1'))
+        self.chat_burst = float(chat_burst or os.getenv('SEND_CHAT_BURST', '3'))
+        self.workers = int(workers or os.getenv('SEND_WORKERS', '4'))
+        self.max_attempts = max_attempts
+
+        self._cond = threading.Condition()
+        self._chats = {}
+        self._order = deque()
+        self._in_flight = set()
+        self._chat_buckets = {}
+        self._global_bucket = TokenBucket(self.global_rate, self.global_rate)
+        self._last_sweep = time.monotonic()
+        self._threads = []
+        self._running = False
+
+        self._sent = 0
+        self._coalesced = 0
+        self._retried = 0
+        self._failed = 0
+        self._depth = 0
+        self._max_depth = 0
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"send-queue-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        print(f"Send queue started: {self.workers} workers, {self.global_rate}/s global, {self.chat_rate}/s per chat")
+
+    def stop(self, timeout=10):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        self._threads = []
+
+        pending = self.depth()
+        if pending:
+            print(f"Send queue stopped with {pending} undelivered messages")
+
+    def send_message(self, chat_id, text, callback=None, **kwargs):
+        self._enqueue('send_message', chat_id, text, kwargs, callback)
+
+    def edit_message_text(self, text, chat_id, message_id, callback=None, **kwargs):
+        kwargs['message_id'] = message_id
+        self._enqueue('edit_message_text', chat_id, text, kwargs, callback)
+
+    def depth(self):
+        with self._cond:
+            return self._depth
+
+    def stats(self):
+        with self._cond:
+            return {
+                'queue_depth': self._depth,
+                'max_queue_depth': self._max_depth,
+                'pending_chats': len(self._chats),
+                'in_flight': len(self._in_flight),
+                'sent': self._sent,
+                'coalesced': self._coalesced,
+                'retried': self._retried,
+                'failed': self._failed
+            }
+
+    def _enqueue(self, method, chat_id, text, kwargs, callback):
+        trace = self.tracer.current() if self.tracer else None
+        if trace:
+            trace.hold()
+            traces = [[trace, time.perf_counter()]]
+        else:
+            traces = []
+
+        with self._cond:
+            queue = self._chats.get(chat_id)
+            if queue is None:
+                queue = self._chats[chat_id] = deque()
+                self._order.append(chat_id)
+
+            if queue and self._can_coalesce(queue[-1], method, text, kwargs):
+                last = queue[-1]
+                last['text'] = f"{last['text']}\n\n{text}"
+                last['kwargs'] = dict(kwargs)
+                if callback:
+                    last['callbacks'].append(callback)
+                for entry in traces:
+                    if any(existing[0] is entry[0] for existing in last['traces']):
+                        entry[0].release()
+                    else:
+                        last['traces'].append(entry)
+                self._coalesced += 1
+            else:
+                queue.append({
+                    'method': method,
+                    'chat_id': chat_id,
+                    'text': text,
+                    'kwargs': dict(kwargs),
+                    'callbacks': [callback] if callback else [],
+                    'traces': traces,
+                    'attempts': 0
+                })
+                self._depth += 1
+                self._max_depth = max(self._max_depth, self._depth)
+
+            self._cond.notify()
+
+    def _can_coalesce(self, last, method, text, kwargs):
+        if method != 'send_message' or last['method'] != 'send_message':
+            return False
+        if last['kwargs'].get('reply_markup') is not None:
+            return False
+
+        other_kwargs = {key: value for key, value in kwargs.items() if key != 'reply_markup'}
+        if last['kwargs'] != other_kwargs:
+            return False
+
+        return len(last['text']) + len(text) + 2 <= MAX_MESSAGE_LENGTH
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _sweep_buckets(self, now):
+        if now - self._last_sweep < BUCKET_SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+
+        idle = [chat_id for chat_id, bucket in self._chat_buckets.items()
+                if chat_id not in self._chats and chat_id not in self._in_flight and bucket.is_full(now)]
+        for chat_id in idle:
+            del self._chat_buckets[chat_id]
+
+    def _next_ready(self, now):
+        self._sweep_buckets(now)
+
+        if not self._order:
+            return None, None
+
+        global_wait = self._global_bucket.wait_time(now)
+        if global_wait > 0:
+            return None, global_wait
+
+        wait = None
+        for _ in range(len(self._order)):
+            chat_id = self._order.popleft()
+
+            if chat_id in self._in_flight:
+                self._order.append(chat_id)
+                continue
+
+            bucket = self._chat_bucket(chat_id)
+            chat_wait = bucket.wait_time(now)
+            if chat_wait > 0:
+                self._order.append(chat_id)
+                wait = chat_wait if wait is None else min(wait, chat_wait)
+                continue
+
+            queue = self._chats[chat_id]
+            op = queue.popleft()
+            self._depth -= 1
+            if queue:
+                self._order.append(chat_id)
+            else:
+                del self._chats[chat_id]
+
+            self._global_bucket.consume(now)
+            bucket.consume(now)
+            self._in_flight.add(chat_id)
+            return op, 0
+
+        return None, wait
+
+    def _requeue(self, op, delay):
+        chat_id = op['chat_id']
+        queue = self._chats.get(chat_id)
+        if queue is None:
+            queue = self._chats[chat_id] = deque()
+            self._order.appendleft(chat_id)
+        queue.appendleft(op)
+        self._depth += 1
+        self._chat_bucket(chat_id).block(time.monotonic(), delay)
+        self._retried += 1
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while True:
+                    op, wait = self._next_ready(time.monotonic())
+                    if op:
+                        break
+                    if not self._running and not self._chats and not self._in_flight:
+                        self._cond.notify_all()
+                        return
+                    self._cond.wait(wait)
+
+            self._deliver(op)
+
+    def _deliver(self, op):
+        op['attempts'] += 1
+        outcome = 'sent'
+        retry_delay = 0
+        started = time.perf_counter()
+
+        try:
+            if op['method'] == 'send_message':
+                self.bot.send_message(op['chat_id'], op['text'], **op['kwargs'])
+            else:
+                self.bot.edit_message_text(op['text'], op['chat_id'], **op['kwargs'])
+        except ApiTelegramException as e:
+            if e.error_code == 429 and op['attempts'] < self.max_attempts:
+                outcome = 'retry'
+                retry_delay = e.result_json.get('parameters', {}).get('retry_after', 1)
+                print(f"Rate limited by Telegram for chat {op['chat_id']}, retrying in {retry_delay}s")
+            else:
+                outcome = 'failed'
+                print(f"Error sending to chat {op['chat_id']}: {e}")
+        except Exception as e:
+            if op['attempts'] < self.max_attempts:
+                outcome = 'retry'
+                retry_delay = 2 ** op['attempts']
+                print(f"Send to chat {op['chat_id']} failed ({e}), retrying in {retry_delay}s")
+            else:
+                outcome = 'failed'
+                print(f"Error sending to chat {op['chat_id']}: {e}")
+
+        elapsed = time.perf_counter() - started
+        for entry in op['traces']:
+            trace, queued_at = entry
+            if queued_at is not None:
+                trace.add_span('outbox_wait', queued_at, started - queued_at)
+                entry[1] = None
+            trace.add_span(f"telegram.{op['method']}", started, elapsed, attempt=op['attempts'], outcome=outcome)
+            if outcome != 'retry':
+                trace.release()
+
+        with self._cond:
+            self._in_flight.discard(op['chat_id'])
+            if outcome == 'sent':
+                self._sent += 1
+            elif outcome == 'failed':
+                self._failed += 1
+            else:
+                self._requeue(op, retry_delay)
+            self._cond.notify_all()
+
+        if outcome != 'retry':
+            for callback in op['callbacks']:
+                try:
+                    callback(outcome == 'sent')
+                except Exception as e:
+                    print(f"Send callback error: {e}")
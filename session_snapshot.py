@@ -0,0 +1,99 @@
+import os
+import json
+import time
+import threading
+
+class SessionSnapshot:
+    def __init__(self, path=None, interval=None, max_age=None):
+        self.path = path or os.getenv('SESSION_SNAPSHOT_PATH', 'session_snapshot.json')
+        self.interval = float(interval or os.getenv('SESSION_SNAPSHOT_INTERVAL', '10'))
+        self.max_age = float(max_age or os.getenv('SESSION_SNAPSHOT_MAX_AGE', '900'))
+        self._sections = {}
+        self._last_payload = None
+        self._save_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def track(self, name, data, int_keys=True):
+        self._sections[name] = (data, int_keys)
+
+    def load(self):
+        started_at = time.perf_counter()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            print(f"Could not read session snapshot {self.path}: {e}")
+            return False
+
+        age = time.time() - snapshot.get('saved_at', 0)
+        if age > self.max_age:
+            print(f"Ignoring session snapshot saved {age:.0f}s ago")
+            return False
+
+        restored = 0
+        for name, items in snapshot.get('sections', {}).items():
+            if name not in self._sections:
+                continue
+            data, int_keys = self._sections[name]
+            for key, value in items.items():
+                data[int(key) if int_keys else key] = value
+            restored += len(items)
+
+        elapsed = (time.perf_counter() - started_at) * 1000
+        print(f"Restored {restored} session entries from {self.path} in {elapsed:.1f} ms")
+        return True
+
+    def save(self):
+        with self._save_lock:
+            sections = None
+            for _ in range(3):
+                try:
+                    sections = json.dumps(
+                        {name: data for name, (data, int_keys) in self._sections.items()},
+                        ensure_ascii=False, separators=(',', ':')
+                    )
+                    break
+                except RuntimeError:
+                    continue
+            if sections is None or sections == self._last_payload:
+                return False
+
+            payload = f'{{"saved_at":{time.time()},"sections":{sections}}}'
+            temp_path = f"{self.path}.tmp"
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    f.write(payload)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                print(f"Could not write session snapshot {self.path}: {e}")
+                return False
+
+            self._last_payload = sections
+            return True
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="session-snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._last_payload = None
+        if self.save():
+            print(f"Session snapshot saved to {self.path}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.save()
+            except Exception as e:
+                print(f"Session snapshot error: {e}")
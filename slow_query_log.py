@@ -0,0 +1,136 @@
+import os
+import json
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from psycopg2 import Error
+
+MAX_PARAMS_LENGTH = 500
+
+def fingerprint(query):
+    return ' '.join(query.split())
+
+class SlowQueryLog:
+    def __init__(self, db, threshold_ms=None, explain_interval=None, explain_ttl=None, path=None, max_entries=None):
+        self.db = db
+        self.threshold_ms = float(threshold_ms or os.getenv('SLOW_QUERY_MS', '200'))
+        self.explain_enabled = os.getenv('SLOW_QUERY_EXPLAIN', '1') == '1'
+        self.explain_interval = float(explain_interval or os.getenv('SLOW_QUERY_EXPLAIN_INTERVAL', '30'))
+        self.explain_ttl = float(explain_ttl or os.getenv('SLOW_QUERY_EXPLAIN_TTL', '600'))
+        self.explain_timeout_ms = int(os.getenv('SLOW_QUERY_EXPLAIN_TIMEOUT_MS', '10000'))
+        self.path = path or os.getenv('SLOW_QUERY_FILE', 'slow_queries.jsonl')
+        self.max_entries = int(max_entries or os.getenv('SLOW_QUERY_MAX_ENTRIES', '100'))
+
+        self._lock = threading.Lock()
+        self._entries = deque(maxlen=self.max_entries)
+        self._explained = {}
+        self._last_explain = 0
+        self._pending = queue.Queue(maxsize=self.max_entries)
+        self._thread = None
+        self._logger = logging.getLogger('bot.slow_queries')
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self.dropped = 0
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        handler = RotatingFileHandler(self.path, maxBytes=5 * 1024 * 1024, backupCount=3, encoding='utf-8', delay=True)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        self._logger.addHandler(handler)
+        self._thread = threading.Thread(target=self._run, name="slow-query-log", daemon=True)
+        self._thread.start()
+        print(f"Logging queries slower than {self.threshold_ms:.0f} ms to {self.path}")
+
+    def stop(self, timeout=5):
+        if not self._thread:
+            return
+        self._pending.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+        for handler in list(self._logger.handlers):
+            self._logger.removeHandler(handler)
+            handler.close()
+
+    def record(self, query, params, elapsed):
+        elapsed_ms = elapsed * 1000
+        if elapsed_ms < self.threshold_ms:
+            return
+
+        text = fingerprint(query)
+        entry = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'duration_ms': round(elapsed_ms, 1),
+            'query': text,
+            'params': repr(params)[:MAX_PARAMS_LENGTH] if params is not None else None,
+            'plan': None
+        }
+
+        explain = False
+        now = time.monotonic()
+        with self._lock:
+            self._entries.append(entry)
+            if (self.explain_enabled and self._explainable(text, params)
+                    and now - self._last_explain >= self.explain_interval
+                    and now - self._explained.get(text, -self.explain_ttl) >= self.explain_ttl):
+                self._last_explain = now
+                self._explained[text] = now
+                explain = True
+
+        try:
+            self._pending.put_nowait((entry, query, params, explain))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def entries(self):
+        with self._lock:
+            return [dict(entry) for entry in reversed(self._entries)]
+
+    def _explainable(self, text, params):
+        if params is not None and not isinstance(params, (tuple, dict)):
+            return False
+        return text.split(' ', 1)[0].upper() in ('SELECT', 'INSERT', 'UPDATE', 'DELETE')
+
+    def _explain(self, query, params):
+        analyze = fingerprint(query).split(' ', 1)[0].upper() == 'SELECT'
+        options = "ANALYZE, BUFFERS" if analyze else "VERBOSE"
+        connection = None
+        try:
+            connection = self.db.open_connection()
+            cursor = connection.cursor()
+            cursor.execute("SET LOCAL statement_timeout = %s", (self.explain_timeout_ms,))
+            cursor.execute(f"EXPLAIN ({options}) {query}", params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+            cursor.close()
+            return plan
+        except Error as e:
+            return f"EXPLAIN failed: {e}"
+        finally:
+            if connection:
+                connection.rollback()
+                connection.close()
+
+    def _run(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                break
+            entry, query, params, explain = item
+
+            if explain:
+                plan = self._explain(query, params)
+                with self._lock:
+                    entry['plan'] = plan
+
+            print(f"Slow query ({entry['duration_ms']} ms): {entry['query'][:200]}")
+            try:
+                with self._lock:
+                    line = json.dumps(entry, ensure_ascii=False)
+                self._logger.info(line)
+            except Exception as e:
+                print(f"Slow query log error: {e}")
@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import queue
+import random
+import logging
+import threading
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+QUERY_SUMMARY_LENGTH = 120
+
+class Trace:
+    def __init__(self, tracer, name, sampled, attrs, origin=None):
+        self.tracer = tracer
+        self.trace_id = os.urandom(8).hex()
+        self.name = name
+        self.sampled = sampled
+        self.attrs = attrs
+        now = time.perf_counter()
+        self.origin = now if origin is None else origin
+        self.started_at = time.time() - (now - self.origin)
+        self.end = self.origin
+        self.spans = []
+        self.error = None
+        self._lock = threading.Lock()
+        self._holds = 1
+
+    def add_span(self, name, started, duration, **attrs):
+        span = {
+            'name': name,
+            'start_ms': round((started - self.origin) * 1000, 3),
+            'duration_ms': round(duration * 1000, 3)
+        }
+        span.update(attrs)
+        with self._lock:
+            self.spans.append(span)
+            self.end = max(self.end, started + duration)
+
+    def set(self, **attrs):
+        with self._lock:
+            self.attrs.update(attrs)
+
+    def hold(self):
+        with self._lock:
+            self._holds += 1
+
+    def release(self):
+        with self._lock:
+            self._holds -= 1
+            done = self._holds == 0
+        if done:
+            self.tracer._complete(self)
+
+    def to_dict(self):
+        with self._lock:
+            record = {
+                'trace_id': self.trace_id,
+                'name': self.name,
+                'started_at': self.started_at,
+                'duration_ms': round((self.end - self.origin) * 1000, 3),
+                'error': self.error
+            }
+            record.update(self.attrs)
+            record['spans'] = sorted(self.spans, key=lambda span: span['start_ms'])
+        return record
+
+class Tracer:
+    def __init__(self, path=None, sample_rate=None, slow_ms=None, max_bytes=None, backups=None):
+        self.enabled = os.getenv('TRACE_ENABLED', '1') == '1'
+        self.path = path or os.getenv('TRACE_FILE', 'traces.jsonl')
+        self.sample_rate = float(sample_rate if sample_rate is not None else os.getenv('TRACE_SAMPLE_RATE', '0.01'))
+        self.slow_ms = float(slow_ms or os.getenv('TRACE_SLOW_MS', '500'))
+        self.max_bytes = int(max_bytes or os.getenv('TRACE_MAX_BYTES', str(10 * 1024 * 1024)))
+        self.backups = int(backups or os.getenv('TRACE_BACKUPS', '5'))
+        self.local = threading.local()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._listener = None
+        self._logger = logging.getLogger('bot.traces')
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self.finished = 0
+        self.kept = 0
+
+    def start(self):
+        if not self.enabled or self._listener:
+            return
+        handler = RotatingFileHandler(self.path, maxBytes=self.max_bytes, backupCount=self.backups, encoding='utf-8', delay=True)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        self._logger.addHandler(QueueHandler(self._queue))
+        self._listener = QueueListener(self._queue, handler)
+        self._listener.start()
+        print(f"Tracing to {self.path} (sample rate {self.sample_rate}, slow threshold {self.slow_ms:.0f} ms)")
+
+    def stop(self):
+        if self._listener:
+            self._listener.stop()
+            self._listener = None
+            for handler in list(self._logger.handlers):
+                self._logger.removeHandler(handler)
+
+    def start_trace(self, name, origin=None, **attrs):
+        if not self.enabled:
+            return None
+        trace = Trace(self, name, random.random() < self.sample_rate, attrs, origin)
+        self.local.trace = trace
+        return trace
+
+    def finish_trace(self, trace, error=None):
+        self.local.trace = None
+        if trace is None:
+            return
+        trace.error = error
+        trace.release()
+
+    def current(self):
+        return getattr(self.local, 'trace', None)
+
+    @contextmanager
+    def span(self, name, **attrs):
+        trace = self.current()
+        if trace is None:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            trace.add_span(name, started, time.perf_counter() - started, **attrs)
+
+    def record_query(self, query, params, elapsed):
+        trace = self.current()
+        if trace is not None:
+            summary = ' '.join(query.split())[:QUERY_SUMMARY_LENGTH]
+            trace.add_span('db', time.perf_counter() - elapsed, elapsed, query=summary)
+
+    def stats(self):
+        with self._lock:
+            return {'finished': self.finished, 'kept': self.kept}
+
+    def _complete(self, trace):
+        record = trace.to_dict()
+        keep = trace.sampled or record['duration_ms'] >= self.slow_ms or trace.error is not None
+        with self._lock:
+            self.finished += 1
+            if keep:
+                self.kept += 1
+        if keep and self._listener:
+            self._logger.info(json.dumps(record, ensure_ascii=False, default=str))
@@ -0,0 +1,130 @@
+import os
+import time
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import OrderedDict
+
+def normalize(text):
+    return ' '.join(unicodedata.normalize('NFKC', text).split()).lower()
+
+class PrefixIndex:
+    def __init__(self):
+        self.keys = []
+        self.entries = []
+
+    @classmethod
+    def build(cls, words):
+        index = cls()
+        pairs = []
+        for english_word, translation_word, label in words:
+            entry = (english_word, translation_word, label)
+            pairs.append((normalize(english_word), entry))
+            pairs.append((normalize(translation_word), entry))
+        pairs.sort(key=lambda pair: pair[0])
+        index.keys = [key for key, entry in pairs]
+        index.entries = [entry for key, entry in pairs]
+        return index
+
+    def __len__(self):
+        return len(self.entries) // 2
+
+    def add(self, english_word, translation_word, label):
+        self.remove(english_word)
+        entry = (english_word, translation_word, label)
+        for key in (normalize(english_word), normalize(translation_word)):
+            position = bisect_left(self.keys, key)
+            self.keys.insert(position, key)
+            self.entries.insert(position, entry)
+
+    def remove(self, english_word):
+        key = normalize(english_word)
+        positions = [position for position, entry in enumerate(self.entries) if normalize(entry[0]) == key]
+        for position in reversed(positions):
+            del self.keys[position]
+            del self.entries[position]
+
+    def search(self, prefix, limit):
+        prefix = normalize(prefix)
+        results = []
+        position = bisect_left(self.keys, prefix)
+        while position < len(self.keys) and len(results) < limit:
+            if not self.keys[position].startswith(prefix):
+                break
+            entry = self.entries[position]
+            if entry not in results:
+                results.append(entry)
+            position += 1
+        return results
+
+class VocabularyIndex:
+    def __init__(self, db, max_users=None, refresh_interval=None):
+        self.db = db
+        self.max_users = int(max_users or os.getenv('VOCAB_INDEX_MAX_USERS', '10000'))
+        self.refresh_interval = float(refresh_interval or os.getenv('VOCAB_INDEX_REFRESH_INTERVAL', '600'))
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._common = PrefixIndex()
+        self._refreshed_at = 0
+        self._users = OrderedDict()
+
+    def refresh_common(self):
+        with self._refresh_lock:
+            if time.monotonic() - self._refreshed_at < self.refresh_interval:
+                return True
+            words = self.db.get_common_words()
+            if words is None:
+                return False
+            index = PrefixIndex.build(words)
+            self._common = index
+            self._refreshed_at = time.monotonic()
+            print(f"Vocabulary index built with {len(index)} common words")
+            return True
+
+    def _user_index(self, user_id):
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is not None:
+                self._users.move_to_end(user_id)
+                return index
+
+        words = self.db.get_user_words(user_id)
+        index = PrefixIndex.build((english_word, translation_word, None) for english_word, translation_word in words)
+
+        with self._lock:
+            self._users.setdefault(user_id, index)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+            return self._users[user_id]
+
+    def search(self, user_id, prefix, limit=20):
+        if time.monotonic() - self._refreshed_at >= self.refresh_interval:
+            self.refresh_common()
+
+        user_index = self._user_index(user_id)
+        with self._lock:
+            results = user_index.search(prefix, limit)
+        seen = {(english_word, translation_word) for english_word, translation_word, label in results}
+        for english_word, translation_word, label in self._common.search(prefix, limit):
+            if len(results) >= limit:
+                break
+            if (english_word, translation_word) not in seen:
+                results.append((english_word, translation_word, label))
+        return results
+
+    def add_user_word(self, user_id, english_word, translation_word):
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is not None:
+                index.add(english_word, translation_word, None)
+
+    def remove_user_word(self, user_id, english_word):
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is not None:
+                index.remove(english_word)
+
+    def stats(self):
+        with self._lock:
+            return {'common_words': len(self._common), 'cached_users': len(self._users)}